@@ -1,5 +1,14 @@
 from celery import Celery
+from celery.signals import (
+    before_task_publish, task_failure, task_postrun, task_prerun,
+    worker_process_init, worker_process_shutdown
+)
 from .config import get_settings
+from . import telemetry
+import logging
+import os
+
+logger = logging.getLogger(__name__)
 
 settings = get_settings()
 
@@ -19,3 +28,49 @@ celery_app.conf.update(
 
 # Auto-discover tasks
 celery_app.autodiscover_tasks(['app.tasks'])
+
+
+@worker_process_init.connect
+def setup_worker_tracing(**kwargs):
+    """Tracer provider per worker process (set up after the fork)"""
+    telemetry.setup_tracing("video-editor-worker")
+
+
+@worker_process_shutdown.connect
+def release_worker_metrics(pid=None, **kwargs):
+    """Drop the live gauges of an exiting process in multiprocess metrics mode"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(pid or os.getpid())
+
+
+@before_task_publish.connect
+def propagate_trace(sender=None, headers=None, **kwargs):
+    """Carry the publisher's trace context in the task message headers"""
+    if headers is not None:
+        telemetry.inject_task_headers(sender, headers)
+
+
+@task_prerun.connect
+def start_task_trace(task_id=None, task=None, **kwargs):
+    telemetry.start_task_span(task_id, task)
+
+
+@task_failure.connect
+def record_task_failure(task_id=None, exception=None, **kwargs):
+    telemetry.fail_task_span(task_id, exception)
+
+
+@task_postrun.connect
+def end_task_trace(task_id=None, state=None, **kwargs):
+    telemetry.end_task_span(task_id, state)
+
+
+@worker_process_init.connect
+def warm_downloaders(**kwargs):
+    """Pre-build pooled yt-dlp instances in every worker process"""
+    from .services import youtube_service
+    try:
+        youtube_service.warm()
+    except Exception as e:
+        logger.warning(f"Could not warm yt-dlp pool: {str(e)}")
@@ -19,10 +19,29 @@ class Settings(BaseSettings):
     stripe_secret_key: str = ""
     stripe_publishable_key: str = ""
     stripe_webhook_secret: str = ""
+    stripe_event_dedupe_ttl: int = 7 * 24 * 3600
+    stripe_event_stream_maxlen: int = 100000
+    stripe_event_claim_idle: int = 60000  # ms before a stuck event is retried
+    entitlement_cache_ttl: float = 5
+    entitlement_cache_size: int = 10000
 
     # Redis
     redis_url: str = "redis://localhost:6379/0"
 
+    # Rate limiting (per client and per upstream host, shared through Redis)
+    rate_limit_enabled: bool = True
+    download_requests_per_minute: int = 6
+    info_requests_per_minute: int = 30
+    upstream_requests_per_minute: int = 60
+    upstream_max_concurrency: int = 4
+    upstream_queue_timeout: float = 30
+    upstream_slot_lease: float = 600
+    coalesce_wait_timeout: float = 300
+    coalesce_result_ttl: int = 60
+    # Reverse proxies in front of the API that append to X-Forwarded-For
+    # (1 behind the nginx in DEPLOYMENT.md); 0 trusts only the socket peer
+    trusted_proxy_count: int = 0
+
     # JWT
     secret_key: str = "change-this-secret-key"
     algorithm: str = "HS256"
@@ -32,10 +51,149 @@ class Settings(BaseSettings):
     max_video_duration: int = 60
     temp_storage_path: str = "/tmp/videos"
 
+    # Resumable uploads (kept outside the /videos static mount)
+    upload_storage_path: str = "/tmp/uploads"
+    max_upload_size: int = 500 * 1024 * 1024
+    upload_ttl: int = 24 * 3600  # seconds an unused upload is kept
+
+    # Share previews (GIF / WebP / teaser), cached outside the /videos static mount
+    preview_cache_path: str = "/tmp/previews"
+    preview_cache_ttl: int = 3600  # seconds an unused preview master is kept
+
+    # Download pre-flight
+    # 'clip' or 'reject' sources over the limit, or whose duration is unknown
+    long_video_policy: str = "clip"
+    default_export_profile: str = "1080p"
+    ydl_pool_size: int = 4  # pooled yt-dlp instances per option set
+    ydl_cache_dir: str = "/tmp/yt-dlp-cache"  # outside the /videos static mount
+    ydl_warm_on_startup: bool = False
+
+    # Rendering
+    ffmpeg_binary: str = "ffmpeg"
+    ffprobe_binary: str = "ffprobe"
+    render_engine: str = "pipeline"  # 'pipeline' (frame pipeline) or 'moviepy'
+    overlay_font: str = "DejaVuSans-Bold.ttf"
+    parallel_render: str = "process"  # 'off', 'process' or 'celery'
+    render_workers: int = 0  # 0 = one per CPU
+    render_segment_seconds: float = 10
+    parallel_render_min_duration: float = 20
+
+    # Adaptive streaming
+    hls_segment_seconds: int = 4
+    upload_concurrency: int = 8
+
+    # Observability
+    trace_exporter: str = "file"  # 'file' (JSON lines), 'console' or 'none'
+    trace_file: str = "/tmp/traces/spans.jsonl"
+    trace_sample_ratio: float = 1.0
+
     class Config:
         env_file = ".env"
 
 
+# Export profiles drive both the render target and how much source we fetch.
+# max_source_height caps the downloaded stream; vcodec is the preferred
+# source codec, picked for cheap decoding rather than compression.
+#
+# The cap is the height of the rendered (vertical) frame, so portrait
+# sources are fetched at full output size. A 16:9 source is centre-cropped
+# to 9/16 of its height, which fills the output width only from 2160p: hd
+# fetches that, while 1080p and preview settle for the 1440p / 720p stream
+# under their cap and upscale the crop 1.33x to keep downloads smaller.
+EXPORT_PROFILES = {
+    "preview": {
+        "resolution": "540x960",
+        "bitrate": "1200k",
+        "fps": 30,
+        "max_source_height": 960,
+        "max_source_tbr": 4000,
+        "vcodec": "h264",
+    },
+    "1080p": {
+        "resolution": "1080x1920",
+        "bitrate": "5000k",
+        "fps": 30,
+        "max_source_height": 1920,
+        "max_source_tbr": 12000,
+        "vcodec": "h264",
+    },
+    "hd": {
+        "resolution": "1080x1920",
+        "bitrate": "8000k",
+        "fps": 30,
+        "max_source_height": 2160,
+        "max_source_tbr": 25000,
+        "vcodec": "h264",
+    },
+}
+
+
+# Adaptive streaming ladder, highest rung first. Rungs taller than the
+# rendered video are skipped.
+HLS_LADDER = [
+    {"name": "1080p", "resolution": "1080x1920", "bitrate": "5000k", "maxrate": "5350k", "bufsize": "7500k", "audio_bitrate": "128k"},
+    {"name": "720p", "resolution": "720x1280", "bitrate": "2800k", "maxrate": "2996k", "bufsize": "4200k", "audio_bitrate": "128k"},
+    {"name": "480p", "resolution": "480x854", "bitrate": "1400k", "maxrate": "1498k", "bufsize": "2100k", "audio_bitrate": "96k"},
+    {"name": "360p", "resolution": "360x640", "bitrate": "800k", "maxrate": "856k", "bufsize": "1200k", "audio_bitrate": "64k"},
+]
+
+
+# Share-preview export targets. All of them are encoded from one cached,
+# downscaled master of the edit, so exporting several formats decodes the
+# source once. The master is built at the largest width and frame rate below.
+PREVIEW_FORMATS = {
+    "gif": {"ext": "gif", "width": 360, "fps": 12, "max_duration": 6, "colors": 128},
+    "webp": {"ext": "webp", "width": 480, "fps": 15, "max_duration": 6, "quality": 70},
+    "teaser": {"ext": "mp4", "width": 480, "fps": 24, "max_duration": 6, "bitrate": "400k"},
+}
+
+
+# What we sell, in the currency's smallest unit. /api/payment/products lists
+# these, payment intents are created at these prices and webhook events
+# whose amount or currency differ are not granted.
+PRODUCTS = {
+    "premium_monthly": {
+        "name": "Premium Monthly",
+        "price": 999,  # $9.99 in cents
+        "currency": "usd",
+        "features": [
+            "No ads",
+            "HD export",
+            "Unlimited videos",
+            "Advanced templates",
+            "Priority support"
+        ],
+    },
+    "hd_export": {
+        "name": "HD Export (One-time)",
+        "price": 299,  # $2.99 in cents
+        "currency": "usd",
+        "features": [
+            "Export current video in HD",
+            "No watermark"
+        ],
+    },
+    "remove_ads": {
+        "name": "Remove Ads (One-time)",
+        "price": 199,  # $1.99 in cents
+        "currency": "usd",
+        "features": [
+            "Remove ads for 24 hours"
+        ],
+    },
+}
+
+
 @lru_cache()
 def get_settings():
     return Settings()
+
+
+def get_export_profile(name: str = None) -> dict:
+    """Look up an export profile, falling back to the configured default"""
+    name = name or get_settings().default_export_profile
+    if name not in EXPORT_PROFILES:
+        raise ValueError(
+            f"Unknown export profile '{name}', expected one of {', '.join(EXPORT_PROFILES)}"
+        )
+    return EXPORT_PROFILES[name]
@@ -1,22 +1,26 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from .config import get_settings
-from .routers import download_router, edit_router, payment_router
+from .routers import download_router, edit_router, payment_router, upload_router
+from . import telemetry
 import logging
 import os
 
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    format='%(asctime)s - %(name)s - %(levelname)s - [trace=%(trace_id)s] %(message)s'
 )
 logger = logging.getLogger(__name__)
 
 # Get settings
 settings = get_settings()
 
+# Tracing (also stamps log records with the trace id used above)
+telemetry.setup_tracing("video-editor-api")
+
 # Create FastAPI app
 app = FastAPI(
     title=settings.app_name,
@@ -33,8 +37,16 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Trace-Id", "Upload-Offset"],
 )
 
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Server span and latency histogram for every request"""
+    return await telemetry.trace_request(request, call_next)
+
+
 # Create temp directory for videos
 os.makedirs(settings.temp_storage_path, exist_ok=True)
 
@@ -42,6 +54,23 @@ os.makedirs(settings.temp_storage_path, exist_ok=True)
 app.include_router(download_router)
 app.include_router(edit_router)
 app.include_router(payment_router)
+app.include_router(upload_router)
+
+
+@app.on_event("startup")
+async def warm_downloaders():
+    """Optionally pre-build pooled yt-dlp instances before taking traffic"""
+    if settings.ydl_warm_on_startup:
+        from .services import youtube_service
+        youtube_service.warm()
+
+
+@app.on_event("shutdown")
+async def release_metrics():
+    """Drop this worker's live gauges in multiprocess metrics mode"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(os.getpid())
 
 
 @app.get("/")
@@ -64,15 +93,27 @@ async def health_check():
     }
 
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: request, stage, task and queue histograms"""
+    body, content_type = await telemetry.render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     """Global exception handler"""
-    logger.error(f"Global exception: {str(exc)}")
+    trace_id = getattr(request.state, 'trace_id', '-')
+    logger.error(
+        f"Unhandled error in {request.method} {request.url.path} (trace {trace_id}): {str(exc)}",
+        exc_info=exc
+    )
     return JSONResponse(
         status_code=500,
         content={
             "error": "Internal server error",
-            "detail": str(exc) if settings.debug else "An error occurred"
+            "detail": str(exc) if settings.debug else "An error occurred",
+            "trace_id": trace_id
         }
     )
 
@@ -5,6 +5,9 @@ from datetime import datetime
 
 class VideoDownloadRequest(BaseModel):
     url: HttpUrl
+    start_time: Optional[float] = None  # Only fetch this section when set
+    end_time: Optional[float] = None
+    profile: Optional[str] = None  # 'preview', '1080p' or 'hd'
 
 
 class VideoDownloadResponse(BaseModel):
@@ -13,6 +16,7 @@ class VideoDownloadResponse(BaseModel):
     duration: float
     thumbnail: str
     download_url: str
+    section_start: float = 0  # Offset of the file within the source video
 
 
 class VideoEditRequest(BaseModel):
@@ -24,16 +28,43 @@ class VideoEditRequest(BaseModel):
     template: Optional[str] = None
 
 
+class UploadCreateRequest(BaseModel):
+    length: int  # Total size in bytes
+    filename: str
+    sha256: Optional[str] = None  # Hex digest; a file we already have isn't sent again
+
+
+class UploadStatusResponse(BaseModel):
+    upload_id: str
+    offset: int  # Bytes received so far; resume PATCHes from here
+    length: int
+    complete: bool
+    sha256: Optional[str] = None
+    deduplicated: bool = False
+    # Set when the declared sha256 is already stored: POST the sha256 of this
+    # byte range of the file to /verify instead of uploading it
+    challenge_offset: Optional[int] = None
+    challenge_length: Optional[int] = None
+
+
+class UploadVerifyRequest(BaseModel):
+    sha256: str  # Hex digest of the challenged byte range
+
+
 class VideoExportRequest(BaseModel):
-    video_id: str
-    format: str = "mp4"
+    video_id: str  # Id of a finalized upload (/api/uploads)
+    format: str = "mp4"  # 'mp4', 'gif', 'webp', 'teaser', or several comma-separated
     resolution: str = "1080x1920"  # Vertical format for TikTok/Reels
+    profile: Optional[str] = None
+    start_time: float = 0
+    end_time: Optional[float] = None
+    text_overlays: Optional[List[dict]] = None
+    to_vertical: bool = True
 
 
 class PaymentRequest(BaseModel):
-    amount: int
-    currency: str = "usd"
-    product_type: str  # 'premium', 'hd_export', etc.
+    product_type: str  # A key of config.PRODUCTS; it sets the amount and currency
+    user_id: Optional[str] = None  # Who gets the entitlement
 
 
 class VideoMetadata(BaseModel):
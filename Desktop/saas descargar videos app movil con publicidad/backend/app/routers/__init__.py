@@ -1,5 +1,6 @@
 from .download import router as download_router
 from .edit import router as edit_router
 from .payment import router as payment_router
+from .upload import router as upload_router
 
-__all__ = ['download_router', 'edit_router', 'payment_router']
+__all__ = ['download_router', 'edit_router', 'payment_router', 'upload_router']
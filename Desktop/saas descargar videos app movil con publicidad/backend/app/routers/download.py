@@ -1,40 +1,90 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Request
 from ..models import VideoDownloadRequest, VideoDownloadResponse
-from ..services import youtube_service, storage_service
+from ..config import get_settings
+from ..services import youtube_service, storage_service, rate_limiter
+from ..services.rate_limiter import RateLimitExceeded, client_id
 import logging
 
 router = APIRouter(prefix="/api/download", tags=["download"])
 logger = logging.getLogger(__name__)
 
+settings = get_settings()
+
+
+def _rate_limited(e: RateLimitExceeded) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail=str(e),
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
 
 @router.post("/", response_model=VideoDownloadResponse)
-async def download_video(request: VideoDownloadRequest):
+async def download_video(request: VideoDownloadRequest, http_request: Request):
     """Download video from YouTube URL"""
-    try:
-        # Download video
-        result = await youtube_service.download_video(str(request.url))
+    url = str(request.url)
+
+    async def fetch():
+        async with rate_limiter.upstream(url):
+            # Download video
+            result = await youtube_service.download_video(
+                url,
+                start_time=request.start_time,
+                end_time=request.end_time,
+                profile=request.profile
+            )
 
         # Upload to S3 (or keep local)
-        download_url = await storage_service.upload_file(result['filepath'])
+        result['download_url'] = await storage_service.upload_file(result['filepath'])
+        return result
+
+    try:
+        await rate_limiter.check_client(
+            client_id(http_request),
+            'download',
+            settings.download_requests_per_minute
+        )
+
+        # Identical downloads in flight on any pod share one fetch
+        result = await rate_limiter.coalesce(
+            f"download:{url}:{request.start_time}:{request.end_time}:{request.profile}",
+            fetch
+        )
 
         return VideoDownloadResponse(
             video_id=result['video_id'],
             title=result['title'],
             duration=result['duration'],
             thumbnail=result['thumbnail'],
-            download_url=download_url
+            download_url=result['download_url'],
+            section_start=result['section_start']
         )
+    except RateLimitExceeded as e:
+        raise _rate_limited(e)
     except Exception as e:
         logger.error(f"Error downloading video: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.get("/info")
-async def get_video_info(url: str):
+async def get_video_info(url: str, http_request: Request):
     """Get video information without downloading"""
+
+    async def fetch():
+        async with rate_limiter.upstream(url):
+            return await youtube_service.get_video_info(url)
+
     try:
-        info = await youtube_service.get_video_info(url)
+        await rate_limiter.check_client(
+            client_id(http_request),
+            'info',
+            settings.info_requests_per_minute
+        )
+
+        info = await rate_limiter.coalesce(f"info:{url}", fetch)
         return info
+    except RateLimitExceeded as e:
+        raise _rate_limited(e)
     except Exception as e:
         logger.error(f"Error getting video info: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
@@ -1,34 +1,68 @@
 from fastapi import APIRouter, HTTPException, UploadFile, File, Form
-from typing import Optional, List
+from typing import Optional, List, Tuple
 import json
 import os
-from ..models import VideoEditRequest
-from ..services import video_service, storage_service
+from ..config import PREVIEW_FORMATS
+from ..models import VideoEditRequest, VideoExportRequest
+from ..services import video_service, storage_service, packaging_service, upload_service, preview_service
+from ..services.upload_service import UploadConflict, UploadNotFound
 import logging
 
 router = APIRouter(prefix="/api/edit", tags=["edit"])
 logger = logging.getLogger(__name__)
 
 
+async def resolve_upload(
+    file: Optional[UploadFile],
+    upload_id: Optional[str],
+    required: bool = True
+) -> Tuple[Optional[str], bool]:
+    """Local path of an input and whether it is a temporary copy to delete
+
+    A finalized resumable upload (upload_id) is shared and deduplicated, so
+    it stays in place for further edits; a multipart file is saved to temp
+    storage as before.
+    """
+    if upload_id:
+        try:
+            return upload_service.get_path(upload_id), False
+        except UploadNotFound as e:
+            raise HTTPException(status_code=404, detail=str(e))
+        except UploadConflict as e:
+            raise HTTPException(status_code=409, detail=str(e))
+
+    if not file:
+        if required:
+            raise HTTPException(status_code=400, detail="Send a file or the id of a finalized upload")
+        return None, False
+
+    path = f"/tmp/videos/{file.filename}"
+    os.makedirs("/tmp/videos", exist_ok=True)
+
+    with open(path, "wb") as buffer:
+        content = await file.read()
+        buffer.write(content)
+    return path, True
+
+
 @router.post("/process")
 async def process_video(
-    video_file: UploadFile = File(...),
+    video_file: Optional[UploadFile] = File(None),
+    upload_id: Optional[str] = Form(None),
     start_time: float = Form(0),
     end_time: Optional[float] = Form(None),
     text_overlays: Optional[str] = Form(None),
     music_file: Optional[UploadFile] = File(None),
-    to_vertical: bool = Form(True)
+    music_upload_id: Optional[str] = Form(None),
+    to_vertical: bool = Form(True),
+    profile: Optional[str] = Form(None),
+    adaptive: bool = Form(False)
 ):
     """Process video with editing options"""
-    try:
-        # Save uploaded video temporarily
-        video_path = f"/tmp/videos/{video_file.filename}"
-        os.makedirs("/tmp/videos", exist_ok=True)
-
-        with open(video_path, "wb") as buffer:
-            content = await video_file.read()
-            buffer.write(content)
+    video_path, video_is_temp = await resolve_upload(video_file, upload_id)
+    music_path, music_is_temp = await resolve_upload(music_file, music_upload_id, required=False)
 
+    try:
         # Parse text overlays if provided
         overlays = None
         if text_overlays:
@@ -37,14 +71,6 @@ async def process_video(
             except:
                 overlays = None
 
-        # Save music file if provided
-        music_path = None
-        if music_file:
-            music_path = f"/tmp/videos/{music_file.filename}"
-            with open(music_path, "wb") as buffer:
-                content = await music_file.read()
-                buffer.write(content)
-
         # Process video
         processed_path = await video_service.process_video(
             filepath=video_path,
@@ -52,16 +78,22 @@ async def process_video(
             end_time=end_time,
             text_overlays=overlays,
             music_path=music_path,
-            to_vertical=to_vertical
+            to_vertical=to_vertical,
+            profile=profile
         )
 
         # Upload processed video
         final_url = await storage_service.upload_file(processed_path)
 
-        # Cleanup temporary files
-        if os.path.exists(video_path):
+        # Package for adaptive streaming if requested
+        playlist_url = None
+        if adaptive:
+            playlist_url = await packaging_service.package_and_upload(processed_path)
+
+        # Cleanup temporary files (finalized uploads are kept for reuse)
+        if video_is_temp and os.path.exists(video_path):
             os.remove(video_path)
-        if music_path and os.path.exists(music_path):
+        if music_is_temp and os.path.exists(music_path):
             os.remove(music_path)
         if os.path.exists(processed_path):
             os.remove(processed_path)
@@ -69,6 +101,7 @@ async def process_video(
         return {
             "status": "success",
             "video_url": final_url,
+            "playlist_url": playlist_url,
             "message": "Video processed successfully"
         }
     except Exception as e:
@@ -78,20 +111,15 @@ async def process_video(
 
 @router.post("/trim")
 async def trim_video(
-    video_file: UploadFile = File(...),
+    video_file: Optional[UploadFile] = File(None),
+    upload_id: Optional[str] = Form(None),
     start_time: float = Form(0),
     end_time: float = Form(60)
 ):
     """Trim video to specified duration"""
-    try:
-        # Save uploaded video temporarily
-        video_path = f"/tmp/videos/{video_file.filename}"
-        os.makedirs("/tmp/videos", exist_ok=True)
-
-        with open(video_path, "wb") as buffer:
-            content = await video_file.read()
-            buffer.write(content)
+    video_path, video_is_temp = await resolve_upload(video_file, upload_id)
 
+    try:
         # Trim video
         trimmed_path = await video_service.trim_video(video_path, start_time, end_time)
 
@@ -99,7 +127,7 @@ async def trim_video(
         final_url = await storage_service.upload_file(trimmed_path)
 
         # Cleanup
-        if os.path.exists(video_path):
+        if video_is_temp and os.path.exists(video_path):
             os.remove(video_path)
         if os.path.exists(trimmed_path):
             os.remove(trimmed_path)
@@ -115,19 +143,14 @@ async def trim_video(
 
 @router.post("/add-text")
 async def add_text_to_video(
-    video_file: UploadFile = File(...),
+    video_file: Optional[UploadFile] = File(None),
+    upload_id: Optional[str] = Form(None),
     text_overlays: str = Form(...)
 ):
     """Add text overlays to video"""
-    try:
-        # Save uploaded video
-        video_path = f"/tmp/videos/{video_file.filename}"
-        os.makedirs("/tmp/videos", exist_ok=True)
-
-        with open(video_path, "wb") as buffer:
-            content = await video_file.read()
-            buffer.write(content)
+    video_path, video_is_temp = await resolve_upload(video_file, upload_id)
 
+    try:
         # Parse overlays
         overlays = json.loads(text_overlays)
 
@@ -138,7 +161,7 @@ async def add_text_to_video(
         final_url = await storage_service.upload_file(processed_path)
 
         # Cleanup
-        if os.path.exists(video_path):
+        if video_is_temp and os.path.exists(video_path):
             os.remove(video_path)
         if os.path.exists(processed_path):
             os.remove(processed_path)
@@ -154,27 +177,23 @@ async def add_text_to_video(
 
 @router.post("/convert-vertical")
 async def convert_to_vertical(
-    video_file: UploadFile = File(...),
-    resolution: str = Form("1080x1920")
+    video_file: Optional[UploadFile] = File(None),
+    upload_id: Optional[str] = Form(None),
+    resolution: Optional[str] = Form(None),
+    profile: Optional[str] = Form(None)
 ):
     """Convert video to vertical format for TikTok/Reels"""
-    try:
-        # Save uploaded video
-        video_path = f"/tmp/videos/{video_file.filename}"
-        os.makedirs("/tmp/videos", exist_ok=True)
-
-        with open(video_path, "wb") as buffer:
-            content = await video_file.read()
-            buffer.write(content)
+    video_path, video_is_temp = await resolve_upload(video_file, upload_id)
 
+    try:
         # Convert to vertical
-        vertical_path = await video_service.convert_to_vertical(video_path, resolution)
+        vertical_path = await video_service.convert_to_vertical(video_path, resolution, profile=profile)
 
         # Upload
         final_url = await storage_service.upload_file(vertical_path)
 
         # Cleanup
-        if os.path.exists(video_path):
+        if video_is_temp and os.path.exists(video_path):
             os.remove(video_path)
         if os.path.exists(vertical_path):
             os.remove(vertical_path)
@@ -186,3 +205,62 @@ async def convert_to_vertical(
     except Exception as e:
         logger.error(f"Error converting to vertical: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/export")
+async def export_video(request: VideoExportRequest):
+    """Export an uploaded video as MP4 and/or share previews (GIF, WebP, teaser)
+
+    Several formats can be asked for at once (format="gif,webp,teaser");
+    the previews of one edit share a single decode of the source.
+    """
+    formats = list(dict.fromkeys(name.strip().lower() for name in request.format.split(',') if name.strip()))
+    unknown = [name for name in formats if name != 'mp4' and name not in PREVIEW_FORMATS]
+    if not formats or unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Export format must be one or more of mp4, {', '.join(PREVIEW_FORMATS)}"
+        )
+    video_path, _ = await resolve_upload(None, request.video_id)
+    source_id = upload_service.status(request.video_id)['sha256']
+
+    try:
+        paths = {}
+        previews = [name for name in formats if name != 'mp4']
+        if previews:
+            paths.update(await preview_service.export(
+                video_path,
+                source_id,
+                previews,
+                start_time=request.start_time,
+                end_time=request.end_time,
+                text_overlays=request.text_overlays,
+                to_vertical=request.to_vertical
+            ))
+
+        if 'mp4' in formats:
+            paths['mp4'] = await video_service.process_video(
+                filepath=video_path,
+                start_time=request.start_time,
+                end_time=request.end_time,
+                text_overlays=request.text_overlays,
+                to_vertical=request.to_vertical,
+                profile=request.profile
+            )
+
+        # Upload, then drop the local renders (the preview cache is kept)
+        exports = {}
+        for name, path in paths.items():
+            exports[name] = await storage_service.upload_file(path)
+            if os.path.exists(path):
+                os.remove(path)
+
+        return {
+            "status": "success",
+            "exports": exports
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error exporting video: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
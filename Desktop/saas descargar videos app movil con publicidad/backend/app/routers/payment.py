@@ -1,24 +1,38 @@
 from fastapi import APIRouter, HTTPException, Request
-import stripe
 from ..models import PaymentRequest
-from ..config import get_settings
+from ..config import get_settings, PRODUCTS
+from ..services.entitlements import QUEUED_EVENT_TYPES, enqueue_event
 import logging
 
 router = APIRouter(prefix="/api/payment", tags=["payment"])
 logger = logging.getLogger(__name__)
 
 settings = get_settings()
-stripe.api_key = settings.stripe_secret_key
+
+
+def get_stripe():
+    """Import and configure the Stripe SDK on first use"""
+    import stripe
+    stripe.api_key = settings.stripe_secret_key
+    return stripe
 
 
 @router.post("/create-payment-intent")
 async def create_payment_intent(payment: PaymentRequest):
-    """Create Stripe payment intent for premium features"""
+    """Create Stripe payment intent for premium features, priced from PRODUCTS"""
+    product = PRODUCTS.get(payment.product_type)
+    if not product:
+        raise HTTPException(status_code=400, detail=f"Unknown product '{payment.product_type}'")
+
     try:
+        stripe = get_stripe()
         intent = stripe.PaymentIntent.create(
-            amount=payment.amount,
-            currency=payment.currency,
-            metadata={'product_type': payment.product_type}
+            amount=product['price'],
+            currency=product['currency'],
+            metadata={
+                'product_type': payment.product_type,
+                'user_id': payment.user_id or ''
+            }
         )
 
         return {
@@ -34,69 +48,41 @@ async def create_payment_intent(payment: PaymentRequest):
 async def get_products():
     """Get available premium products"""
     return {
-        "products": [
-            {
-                "id": "premium_monthly",
-                "name": "Premium Monthly",
-                "price": 999,  # $9.99 in cents
-                "currency": "usd",
-                "features": [
-                    "No ads",
-                    "HD export",
-                    "Unlimited videos",
-                    "Advanced templates",
-                    "Priority support"
-                ]
-            },
-            {
-                "id": "hd_export",
-                "name": "HD Export (One-time)",
-                "price": 299,  # $2.99 in cents
-                "currency": "usd",
-                "features": [
-                    "Export current video in HD",
-                    "No watermark"
-                ]
-            },
-            {
-                "id": "remove_ads",
-                "name": "Remove Ads (One-time)",
-                "price": 199,  # $1.99 in cents
-                "currency": "usd",
-                "features": [
-                    "Remove ads for 24 hours"
-                ]
-            }
-        ]
+        "products": [{"id": product_id, **product} for product_id, product in PRODUCTS.items()]
     }
 
 
 @router.post("/webhook")
 async def stripe_webhook(request: Request):
-    """Handle Stripe webhooks"""
+    """Handle Stripe webhooks
+
+    Only verifies the signature and queues the event; entitlements are
+    applied by app.stripe_consumer.
+    """
     payload = await request.body()
     sig_header = request.headers.get('stripe-signature')
 
     try:
+        stripe = get_stripe()
         event = stripe.Webhook.construct_event(
             payload, sig_header, settings.stripe_webhook_secret
         )
-
-        # Handle different event types
-        if event['type'] == 'payment_intent.succeeded':
-            payment_intent = event['data']['object']
-            logger.info(f"Payment succeeded: {payment_intent['id']}")
-            # TODO: Activate premium features for user
-
-        elif event['type'] == 'payment_intent.payment_failed':
-            payment_intent = event['data']['object']
-            logger.warning(f"Payment failed: {payment_intent['id']}")
-
-        return {"status": "success"}
     except Exception as e:
         logger.error(f"Webhook error: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
 
+    if event['type'] in QUEUED_EVENT_TYPES:
+        try:
+            queued = await enqueue_event(event['id'], event['type'], payload.decode())
+            if not queued:
+                logger.info(f"Duplicate Stripe event ignored: {event['id']}")
+        except Exception as e:
+            # Not acknowledged, so Stripe retries the delivery
+            logger.error(f"Error queueing Stripe event {event['id']}: {str(e)}")
+            raise HTTPException(status_code=503, detail="Event queue unavailable")
+
+    return {"status": "success"}
+
 
 @router.get("/config")
 async def get_stripe_config():
@@ -0,0 +1,92 @@
+from fastapi import APIRouter, HTTPException, Header, Request
+from ..models import UploadCreateRequest, UploadStatusResponse, UploadVerifyRequest
+from ..services import upload_service
+from ..services.upload_service import UploadConflict, UploadNotFound
+import logging
+
+router = APIRouter(prefix="/api/uploads", tags=["uploads"])
+logger = logging.getLogger(__name__)
+
+
+def _conflict(e: UploadConflict) -> HTTPException:
+    return HTTPException(
+        status_code=409,
+        detail=str(e),
+        headers={"Upload-Offset": str(e.offset)}
+    )
+
+
+@router.post("/", response_model=UploadStatusResponse, status_code=201)
+async def create_upload(request: UploadCreateRequest):
+    """Start a resumable upload
+
+    Send the file's sha256 to skip the transfer when we already have it:
+    the response then carries challenge_offset/challenge_length, and POSTing
+    the sha256 of that byte range to /verify completes the upload.
+    """
+    try:
+        return upload_service.create(request.length, request.filename, request.sha256)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error creating upload: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/{upload_id}", response_model=UploadStatusResponse)
+async def get_upload(upload_id: str):
+    """Upload status; offset is where to resume after a dropped connection"""
+    try:
+        return upload_service.status(upload_id)
+    except UploadNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@router.patch("/{upload_id}", response_model=UploadStatusResponse)
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    upload_offset: int = Header(...)
+):
+    """Append the raw request body at Upload-Offset"""
+    try:
+        return await upload_service.append(upload_id, upload_offset, request.stream())
+    except UploadNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except UploadConflict as e:
+        raise _conflict(e)
+    except Exception as e:
+        logger.error(f"Error writing upload chunk: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/{upload_id}/verify", response_model=UploadStatusResponse)
+async def verify_upload(upload_id: str, request: UploadVerifyRequest):
+    """Answer the challenge of an upload whose file we already have"""
+    try:
+        return upload_service.verify(upload_id, request.sha256)
+    except UploadNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except UploadConflict as e:
+        raise _conflict(e)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error verifying upload: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/{upload_id}/finalize", response_model=UploadStatusResponse)
+async def finalize_upload(upload_id: str):
+    """Verify a fully received upload; the id can then be passed to /api/edit"""
+    try:
+        return await upload_service.finalize(upload_id)
+    except UploadNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except UploadConflict as e:
+        raise _conflict(e)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error finalizing upload: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
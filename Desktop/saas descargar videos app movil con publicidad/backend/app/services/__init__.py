@@ -1,5 +1,27 @@
-from .youtube_service import youtube_service
-from .video_service import video_service
-from .storage_service import storage_service
+"""Service singletons, constructed on first access
 
-__all__ = ['youtube_service', 'video_service', 'storage_service']
+Service modules are imported when one of the names below is first looked
+up, and they keep moviepy, yt_dlp and boto3 behind method-level imports,
+so the API process never loads the render stack unless a request needs it.
+"""
+from importlib import import_module
+
+_SERVICES = {
+    'youtube_service': '.youtube_service',
+    'video_service': '.video_service',
+    'storage_service': '.storage_service',
+    'packaging_service': '.packaging_service',
+    'rate_limiter': '.rate_limiter',
+    'upload_service': '.upload_service',
+    'preview_service': '.preview_service',
+}
+
+__all__ = list(_SERVICES)
+
+
+def __getattr__(name):
+    if name not in _SERVICES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    service = getattr(import_module(_SERVICES[name], __name__), name)
+    globals()[name] = service
+    return service
@@ -0,0 +1,157 @@
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from ..config import get_settings, PRODUCTS
+from .redis_client import get_async_redis
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+EVENT_STREAM = "stripe:events"
+CONSUMER_GROUP = "entitlements"
+QUEUED_EVENT_TYPES = ('payment_intent.succeeded', 'payment_intent.payment_failed')
+
+# What each product in PRODUCTS grants: ('extend', field, seconds) pushes an
+# expiry forward, ('credit', field, count) adds one-shot credits.
+PRODUCT_GRANTS = {
+    'premium_monthly': ('extend', 'premium_until', 30 * 24 * 3600),
+    'hd_export': ('credit', 'hd_exports', 1),
+    'remove_ads': ('extend', 'no_ads_until', 24 * 3600),
+}
+
+# Deduplicate on the Stripe event id and append to the stream atomically
+ENQUEUE_SCRIPT = """
+if redis.call('SET', KEYS[1], 1, 'NX', 'EX', ARGV[1]) == false then
+    return 0
+end
+redis.call('XADD', KEYS[2], 'MAXLEN', '~', ARGV[2], '*', 'id', ARGV[3], 'type', ARGV[4], 'payload', ARGV[5])
+return 1
+"""
+
+# Apply a grant at most once per event id
+APPLY_GRANT_SCRIPT = """
+if redis.call('SET', KEYS[2], 1, 'NX', 'EX', ARGV[1]) == false then
+    return 0
+end
+if ARGV[2] == 'extend' then
+    local current = tonumber(redis.call('HGET', KEYS[1], ARGV[3])) or 0
+    local now = tonumber(ARGV[5])
+    if current < now then current = now end
+    redis.call('HSET', KEYS[1], ARGV[3], current + tonumber(ARGV[4]))
+else
+    redis.call('HINCRBY', KEYS[1], ARGV[3], tonumber(ARGV[4]))
+end
+return 1
+"""
+
+def entitlements_key(user_id: str) -> str:
+    return f"entitlements:{user_id}"
+
+
+async def enqueue_event(event_id: str, event_type: str, payload: str) -> bool:
+    """Put a verified Stripe event on the durable stream; False if already seen"""
+    queued = await get_async_redis().eval(
+        ENQUEUE_SCRIPT, 2,
+        f"stripe:event:{event_id}", EVENT_STREAM,
+        settings.stripe_event_dedupe_ttl, settings.stripe_event_stream_maxlen,
+        event_id, event_type, payload
+    )
+    return bool(queued)
+
+
+def apply_event(redis, event_id: str, event: Dict) -> bool:
+    """Update entitlements for one Stripe event; safe to call more than once"""
+    payment_intent = event['data']['object']
+
+    if event['type'] == 'payment_intent.payment_failed':
+        logger.warning(f"Payment failed: {payment_intent['id']}")
+        return False
+
+    metadata = payment_intent.get('metadata') or {}
+    user_id = metadata.get('user_id')
+    product = PRODUCTS.get(metadata.get('product_type'))
+    grant = PRODUCT_GRANTS.get(metadata.get('product_type'))
+    if not user_id or not product or not grant:
+        logger.warning(f"Payment {payment_intent['id']} has no user or known product, nothing to grant")
+        return False
+
+    # The metadata alone doesn't say what was paid for
+    paid = payment_intent.get('amount_received', payment_intent.get('amount'))
+    if paid != product['price'] or payment_intent.get('currency') != product['currency']:
+        logger.warning(
+            f"Payment {payment_intent['id']} of {paid} {payment_intent.get('currency')} doesn't match "
+            f"{metadata['product_type']} ({product['price']} {product['currency']}), nothing to grant"
+        )
+        return False
+
+    kind, field, amount = grant
+    applied = redis.eval(
+        APPLY_GRANT_SCRIPT, 2,
+        entitlements_key(user_id), f"entitlements:applied:{event_id}",
+        settings.stripe_event_dedupe_ttl, kind, field, amount, int(time.time())
+    )
+    if applied:
+        logger.info(f"Granted {metadata['product_type']} to {user_id} (payment {payment_intent['id']})")
+    return bool(applied)
+
+
+class EntitlementStore:
+    """Read side of the entitlements, with a per-process TTL cache
+
+    Hot paths (every render request) hit the local cache and never wait on
+    Redis; entries refresh after entitlement_cache_ttl seconds. The cache
+    holds at most entitlement_cache_size users, oldest entries going first.
+    """
+
+    def __init__(self):
+        # Insertion order is expiry order, since every entry gets the same TTL
+        self._cache: OrderedDict[str, Tuple[float, Dict[str, float]]] = OrderedDict()
+
+    async def get(self, user_id: Optional[str]) -> Dict[str, float]:
+        if not user_id:
+            return {}
+
+        now = time.monotonic()
+        cached = self._cache.get(user_id)
+        if cached and cached[0] > now:
+            return cached[1]
+
+        raw = await get_async_redis().hgetall(entitlements_key(user_id))
+        entitlements = {key.decode(): float(value) for key, value in raw.items()}
+        self._store(user_id, (now + settings.entitlement_cache_ttl, entitlements), now)
+        return entitlements
+
+    def _store(self, user_id: str, entry: Tuple[float, Dict[str, float]], now: float):
+        self._cache.pop(user_id, None)
+        self._cache[user_id] = entry
+        while self._cache:
+            oldest = next(iter(self._cache.values()))
+            if oldest[0] > now and len(self._cache) <= settings.entitlement_cache_size:
+                break
+            self._cache.popitem(last=False)
+
+    def invalidate(self, user_id: str):
+        self._cache.pop(user_id, None)
+
+    async def is_premium(self, user_id: Optional[str]) -> bool:
+        entitlements = await self.get(user_id)
+        return entitlements.get('premium_until', 0) > time.time()
+
+    async def has_no_ads(self, user_id: Optional[str]) -> bool:
+        entitlements = await self.get(user_id)
+        now = time.time()
+        return entitlements.get('premium_until', 0) > now or entitlements.get('no_ads_until', 0) > now
+
+    async def can_export_hd(self, user_id: Optional[str]) -> bool:
+        entitlements = await self.get(user_id)
+        return entitlements.get('premium_until', 0) > time.time() or entitlements.get('hd_exports', 0) > 0
+
+
+entitlement_store = EntitlementStore()
+
+
+def decode_event(fields: Dict[bytes, bytes]) -> Tuple[str, Dict]:
+    """Stream entry fields back into (event id, event dict)"""
+    return fields[b'id'].decode(), json.loads(fields[b'payload'])
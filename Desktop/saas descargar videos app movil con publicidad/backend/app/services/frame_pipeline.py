@@ -0,0 +1,262 @@
+import subprocess
+import tempfile
+from typing import Dict, List, Optional, Tuple
+from ..config import get_settings
+from .media_probe import has_audio_stream, probe_duration, probe_frame_rate, probe_video_size
+
+settings = get_settings()
+
+Rect = Tuple[int, int, int, int]
+
+
+def vertical_crop(source_w: int, source_h: int, resolution: str) -> Rect:
+    """Centre crop (x, y, w, h) of the source matching the target aspect ratio"""
+    width, height = map(int, resolution.split('x'))
+    target_ratio = width / height
+
+    if source_w / source_h > target_ratio:
+        crop_w = int(source_h * target_ratio)
+        return (int(source_w / 2 - crop_w / 2), 0, crop_w, source_h)
+
+    crop_h = int(source_w / target_ratio)
+    return (0, int(source_h / 2 - crop_h / 2), source_w, crop_h)
+
+
+def _load_font(size: int):
+    from PIL import ImageFont
+
+    for name in (settings.overlay_font, 'DejaVuSans-Bold.ttf', 'Arial Bold.ttf'):
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    return ImageFont.load_default()
+
+
+def _place(position, axis_size: int, item_size: int, start_name: str, end_name: str) -> float:
+    """Resolve one moviepy-style position component to a pixel offset"""
+    if isinstance(position, (int, float)):
+        return position
+    if position == 'center':
+        return (axis_size - item_size) / 2
+    if position == end_name:
+        return axis_size - item_size
+    return 0
+
+
+class Overlay:
+    """A rasterised text overlay, blended in place inside its bounding box
+
+    The bitmap, its alpha and a float scratch buffer are built once; each
+    frame only touches the pixels under the text while it is on screen.
+    """
+
+    def __init__(self, rgba, x: int, y: int, frame_w: int, frame_h: int, start: float, end: float):
+        import numpy as np
+
+        self.start = start
+        self.end = end
+
+        # Clip the bitmap to the frame once, up front
+        x0, y0 = max(x, 0), max(y, 0)
+        x1 = min(x + rgba.shape[1], frame_w)
+        y1 = min(y + rgba.shape[0], frame_h)
+        self.visible = x1 > x0 and y1 > y0
+        self.box = (slice(y0, y1), slice(x0, x1))
+        if not self.visible:
+            return
+
+        bitmap = rgba[y0 - y:y1 - y, x0 - x:x1 - x]
+        alpha = bitmap[..., 3:4].astype(np.float32) / 255
+        self.inv_alpha = 1 - alpha
+        self.premultiplied = bitmap[..., :3].astype(np.float32) * alpha
+        self.scratch = np.empty(self.premultiplied.shape, dtype=np.float32)
+
+    def active(self, t: float) -> bool:
+        return self.visible and self.start <= t < self.end
+
+    def blend(self, frame):
+        import numpy as np
+
+        region = frame[self.box]  # a view into the frame buffer
+        np.multiply(region, self.inv_alpha, out=self.scratch)
+        np.add(self.scratch, self.premultiplied, out=self.scratch)
+        np.copyto(region, self.scratch, casting='unsafe')
+
+
+def build_overlays(
+    overlays: Optional[List[Dict]],
+    source_size: Tuple[int, int],
+    crop: Rect,
+    scale: float,
+    frame_size: Tuple[int, int],
+    duration: float
+) -> List[Overlay]:
+    """Rasterise overlays at output scale, positioned as moviepy would on the source"""
+    import numpy as np
+    from PIL import Image, ImageDraw
+
+    source_w, source_h = source_size
+    crop_x, crop_y = crop[0], crop[1]
+    built = []
+
+    for overlay in overlays or []:
+        fontsize = max(1, round(overlay.get('fontsize', 50) * scale))
+        stroke = max(1, round(2 * scale))
+        font = _load_font(fontsize)
+        text = overlay.get('text', '')
+
+        left, top, right, bottom = ImageDraw.Draw(Image.new('RGBA', (1, 1))).textbbox(
+            (0, 0), text, font=font, stroke_width=stroke
+        )
+        image = Image.new('RGBA', (max(1, right - left), max(1, bottom - top)), (0, 0, 0, 0))
+        ImageDraw.Draw(image).text(
+            (-left, -top), text, font=font,
+            fill=overlay.get('color', 'white'),
+            stroke_width=stroke, stroke_fill='black'
+        )
+        rgba = np.asarray(image)
+
+        position = overlay.get('position', ('center', 'bottom'))
+        if isinstance(position, str):
+            position = (position, position)
+        text_w, text_h = rgba.shape[1] / scale, rgba.shape[0] / scale
+        x = _place(position[0], source_w, text_w, 'left', 'right')
+        y = _place(position[1], source_h, text_h, 'top', 'bottom')
+
+        start = overlay.get('start', 0)
+        length = overlay.get('duration')
+        built.append(Overlay(
+            rgba,
+            round((x - crop_x) * scale),
+            round((y - crop_y) * scale),
+            frame_size[0], frame_size[1],
+            start,
+            start + length if length is not None else duration
+        ))
+
+    return [overlay for overlay in built if overlay.visible]
+
+
+def _read_frame(stream, buffer) -> bool:
+    """Fill buffer from the decoder pipe; False at end of stream"""
+    filled = 0
+    size = len(buffer)
+    while filled < size:
+        count = stream.readinto(buffer[filled:])
+        if not count:
+            return False
+        filled += count
+    return True
+
+
+def render(job: Dict) -> str:
+    """Decode, composite and encode an edit in one pass
+
+    ffmpeg decodes straight into output geometry (the crop and scale run in
+    its filter graph, so cropped-away pixels never reach Python) and writes
+    raw frames into one preallocated buffer. Overlays are blended into that
+    buffer in place and the same memory is handed to the encoder's stdin.
+    job keys: source, start, end, overlays, resolution, bitrate, fps,
+    output_path, audio, music_path, music_volume, threads, vcodec, pix_fmt.
+    """
+    import numpy as np
+
+    source = job['source']
+    start = job.get('start') or 0
+    end = job.get('end') or probe_duration(source)
+    duration = end - start
+    source_w, source_h = probe_video_size(source)
+    fps = job.get('fps') or probe_frame_rate(source)
+
+    if job.get('resolution'):
+        width, height = map(int, job['resolution'].split('x'))
+        crop = vertical_crop(source_w, source_h, job['resolution'])
+        video_filter = f"crop={crop[2]}:{crop[3]}:{crop[0]}:{crop[1]},scale={width}:{height},fps={fps}"
+    else:
+        width, height = source_w - source_w % 2, source_h - source_h % 2
+        crop = (0, 0, width, height)
+        video_filter = f"crop={width}:{height}:0:0,fps={fps}"
+    scale = height / crop[3]
+
+    overlays = build_overlays(
+        job.get('overlays'), (source_w, source_h), crop, scale, (width, height), duration
+    )
+
+    decoder_cmd = [
+        settings.ffmpeg_binary, '-v', 'error', '-nostdin',
+        '-ss', str(start), '-t', str(duration), '-i', source,
+        '-vf', video_filter,
+        '-f', 'rawvideo', '-pix_fmt', 'rgb24', 'pipe:1'
+    ]
+
+    encoder_cmd = [
+        settings.ffmpeg_binary, '-y', '-v', 'error',
+        '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{width}x{height}', '-r', str(fps),
+        '-i', 'pipe:0'
+    ]
+    source_audio = job.get('audio', True) and has_audio_stream(source)
+    music_path = job.get('music_path') if job.get('audio', True) else None
+    audio_inputs = 0
+    if source_audio:
+        encoder_cmd += ['-ss', str(start), '-t', str(duration), '-i', source]
+        audio_inputs += 1
+    if music_path:
+        encoder_cmd += ['-stream_loop', '-1', '-t', str(duration), '-i', music_path]
+        audio_inputs += 1
+
+    encoder_cmd += ['-map', '0:v']
+    if source_audio and music_path:
+        encoder_cmd += [
+            '-filter_complex',
+            f"[2:a]volume={job.get('music_volume', 0.3)}[music];"
+            f"[1:a][music]amix=inputs=2:duration=first:normalize=0[mixed]",
+            '-map', '[mixed]'
+        ]
+    elif music_path:
+        encoder_cmd += ['-filter:a', f"volume={job.get('music_volume', 0.3)}", '-map', '1:a']
+    elif source_audio:
+        encoder_cmd += ['-map', '1:a']
+    if audio_inputs:
+        encoder_cmd += ['-c:a', 'aac', '-shortest']
+
+    encoder_cmd += ['-c:v', job.get('vcodec') or 'libx264', '-pix_fmt', job.get('pix_fmt') or 'yuv420p']
+    if job.get('bitrate'):
+        encoder_cmd += ['-b:v', job['bitrate']]
+    if job.get('threads'):
+        encoder_cmd += ['-threads', str(job['threads'])]
+    if job['output_path'].endswith('.mp4'):
+        encoder_cmd += ['-movflags', '+faststart']
+    encoder_cmd.append(job['output_path'])
+
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+    frame_bytes = memoryview(frame).cast('B')
+
+    # stderr goes to files so a chatty ffmpeg can't fill a pipe and stall
+    with tempfile.TemporaryFile() as decoder_log, tempfile.TemporaryFile() as encoder_log:
+        decoder = subprocess.Popen(decoder_cmd, stdout=subprocess.PIPE, stderr=decoder_log, bufsize=0)
+        encoder = subprocess.Popen(encoder_cmd, stdin=subprocess.PIPE, stderr=encoder_log, bufsize=0)
+
+        try:
+            index = 0
+            while _read_frame(decoder.stdout, frame_bytes):
+                t = index / fps
+                for overlay in overlays:
+                    if overlay.active(t):
+                        overlay.blend(frame)
+                encoder.stdin.write(frame_bytes)
+                index += 1
+        finally:
+            encoder.stdin.close()
+            decoder.stdout.close()
+            decoder.wait()
+            encoder.wait()
+
+        if decoder.returncode != 0:
+            decoder_log.seek(0)
+            raise Exception(f"Error decoding video: {decoder_log.read().decode(errors='replace').strip()}")
+        if encoder.returncode != 0:
+            encoder_log.seek(0)
+            raise Exception(f"Error encoding video: {encoder_log.read().decode(errors='replace').strip()}")
+
+    return job['output_path']
@@ -0,0 +1,91 @@
+import subprocess
+from typing import List, Tuple
+from ..config import get_settings
+
+settings = get_settings()
+
+
+def probe_duration(filepath: str) -> float:
+    """Container duration in seconds, read with ffprobe"""
+    result = subprocess.run(
+        [
+            settings.ffprobe_binary, '-v', 'error',
+            '-show_entries', 'format=duration',
+            '-of', 'default=noprint_wrappers=1:nokey=1',
+            filepath
+        ],
+        capture_output=True, text=True, check=True
+    )
+    return float(result.stdout.strip() or 0)
+
+
+def probe_keyframes(filepath: str) -> List[float]:
+    """Keyframe timestamps of the first video stream
+
+    Reads packet flags only, so nothing is decoded.
+    """
+    result = subprocess.run(
+        [
+            settings.ffprobe_binary, '-v', 'error',
+            '-select_streams', 'v:0',
+            '-show_entries', 'packet=pts_time,flags',
+            '-of', 'csv=p=0',
+            filepath
+        ],
+        capture_output=True, text=True, check=True
+    )
+    keyframes = []
+    for line in result.stdout.splitlines():
+        pts_time, _, flags = line.partition(',')
+        if 'K' in flags and pts_time not in ('', 'N/A'):
+            keyframes.append(float(pts_time))
+    return sorted(keyframes)
+
+
+def has_audio_stream(filepath: str) -> bool:
+    """Whether the file carries at least one audio stream"""
+    result = subprocess.run(
+        [
+            settings.ffprobe_binary, '-v', 'error',
+            '-select_streams', 'a:0',
+            '-show_entries', 'stream=index',
+            '-of', 'csv=p=0',
+            filepath
+        ],
+        capture_output=True, text=True
+    )
+    return bool(result.stdout.strip())
+
+
+def probe_video_size(filepath: str) -> Tuple[int, int]:
+    """Width and height of the first video stream"""
+    result = subprocess.run(
+        [
+            settings.ffprobe_binary, '-v', 'error',
+            '-select_streams', 'v:0',
+            '-show_entries', 'stream=width,height',
+            '-of', 'csv=p=0:s=x',
+            filepath
+        ],
+        capture_output=True, text=True, check=True
+    )
+    width, height = result.stdout.strip().split('x')[:2]
+    return int(width), int(height)
+
+
+def probe_frame_rate(filepath: str) -> float:
+    """Average frame rate of the first video stream"""
+    result = subprocess.run(
+        [
+            settings.ffprobe_binary, '-v', 'error',
+            '-select_streams', 'v:0',
+            '-show_entries', 'stream=avg_frame_rate',
+            '-of', 'default=noprint_wrappers=1:nokey=1',
+            filepath
+        ],
+        capture_output=True, text=True, check=True
+    )
+    numerator, _, denominator = result.stdout.strip().partition('/')
+    if not denominator or float(denominator) == 0:
+        return float(numerator or 30)
+    return float(numerator) / float(denominator)
@@ -0,0 +1,122 @@
+import asyncio
+import os
+import subprocess
+import uuid
+from typing import Dict, List
+from ..config import get_settings, HLS_LADDER
+from .media_probe import has_audio_stream, probe_video_size
+from .storage_service import storage_service
+from ..telemetry import traced, with_context
+
+settings = get_settings()
+
+
+class PackagingService:
+    def __init__(self):
+        self.temp_path = settings.temp_storage_path
+
+    def _short_side(self, rung: Dict) -> int:
+        return min(map(int, rung['resolution'].split('x')))
+
+    def select_ladder(self, source_width: int, source_height: int) -> List[Dict]:
+        """Ladder rungs that don't upscale the source, at least the lowest one
+
+        Rungs are compared on the short side, so a landscape export (e.g.
+        1920x1080, not converted to vertical) keeps its 1080p rung.
+        """
+        source_short = min(source_width, source_height)
+        rungs = [rung for rung in HLS_LADDER if self._short_side(rung) <= source_short]
+        return rungs or HLS_LADDER[-1:]
+
+    def build_command(
+        self,
+        filepath: str,
+        output_dir: str,
+        ladder: List[Dict],
+        with_audio: bool,
+        landscape: bool = False
+    ) -> List[str]:
+        """Single ffmpeg invocation: decode once, split, encode every rung"""
+        count = len(ladder)
+        labels = ''.join(f'[s{i}]' for i in range(count))
+        filters = [f'[0:v]split={count}{labels}']
+        for i, rung in enumerate(ladder):
+            # Fit the rung's short side to the source's short side
+            short = self._short_side(rung)
+            scale = f'scale=-2:{short}' if landscape else f'scale={short}:-2'
+            filters.append(f'[s{i}]{scale}[v{i}]')
+
+        command = [
+            settings.ffmpeg_binary, '-y', '-v', 'error',
+            '-i', filepath,
+            '-filter_complex', ';'.join(filters)
+        ]
+
+        stream_map = []
+        for i, rung in enumerate(ladder):
+            command += [
+                '-map', f'[v{i}]',
+                f'-c:v:{i}', 'libx264',
+                f'-b:v:{i}', rung['bitrate'],
+                f'-maxrate:v:{i}', rung['maxrate'],
+                f'-bufsize:v:{i}', rung['bufsize'],
+            ]
+            if with_audio:
+                command += [
+                    '-map', 'a:0',
+                    f'-c:a:{i}', 'aac',
+                    f'-b:a:{i}', rung['audio_bitrate'],
+                ]
+                stream_map.append(f"v:{i},a:{i},name:{rung['name']}")
+            else:
+                stream_map.append(f"v:{i},name:{rung['name']}")
+
+        segment_seconds = settings.hls_segment_seconds
+        command += [
+            '-preset', 'veryfast',
+            # Keyframes on segment boundaries keep every rung switchable
+            '-force_key_frames', f'expr:gte(t,n_forced*{segment_seconds})',
+            '-f', 'hls',
+            '-hls_time', str(segment_seconds),
+            '-hls_playlist_type', 'vod',
+            '-hls_segment_type', 'fmp4',
+            '-hls_flags', 'independent_segments',
+            '-hls_fmp4_init_filename', 'init.mp4',
+            '-hls_segment_filename', f'{output_dir}/%v/seg_%03d.m4s',
+            '-master_pl_name', 'master.m3u8',
+            '-var_stream_map', ' '.join(stream_map),
+            f'{output_dir}/%v/playlist.m3u8'
+        ]
+        return command
+
+    @traced('hls.package')
+    def package_hls(self, filepath: str) -> str:
+        """Package a rendered MP4 as a multi-bitrate fMP4 HLS ladder"""
+        output_dir = f"{self.temp_path}/{uuid.uuid4()}_hls"
+        os.makedirs(output_dir, exist_ok=True)
+
+        width, height = probe_video_size(filepath)
+        ladder = self.select_ladder(width, height)
+        command = self.build_command(
+            filepath, output_dir, ladder, has_audio_stream(filepath), landscape=width > height
+        )
+
+        try:
+            subprocess.run(command, capture_output=True, text=True, check=True)
+        except subprocess.CalledProcessError as e:
+            raise Exception(f"Error packaging HLS: {e.stderr.strip()}")
+
+        return output_dir
+
+    async def package_and_upload(self, filepath: str) -> str:
+        """Package a rendered video for adaptive streaming and return the master playlist URL"""
+        try:
+            loop = asyncio.get_running_loop()
+            output_dir = await loop.run_in_executor(None, with_context(self.package_hls, filepath))
+            base_url = await storage_service.upload_directory(output_dir)
+            return f"{base_url}/master.m3u8"
+        except Exception as e:
+            raise Exception(f"Error creating adaptive stream: {str(e)}")
+
+
+packaging_service = PackagingService()
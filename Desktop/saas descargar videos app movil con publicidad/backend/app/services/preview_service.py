@@ -0,0 +1,224 @@
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import time
+import uuid
+from typing import Dict, List, Optional
+from ..config import get_settings, PREVIEW_FORMATS
+from ..telemetry import traced, with_context
+from . import frame_pipeline
+from .media_probe import probe_duration, probe_video_size
+
+settings = get_settings()
+
+# The master covers every preview format: largest width, frame rate and length
+MASTER_WIDTH = max(spec['width'] for spec in PREVIEW_FORMATS.values())
+MASTER_FPS = max(spec['fps'] for spec in PREVIEW_FORMATS.values())
+MASTER_DURATION = max(spec['max_duration'] for spec in PREVIEW_FORMATS.values())
+
+
+def _run_ffmpeg(command: List[str], action: str):
+    try:
+        subprocess.run(command, capture_output=True, text=True, check=True)
+    except subprocess.CalledProcessError as e:
+        raise Exception(f"Error {action}: {e.stderr.strip()}")
+
+
+class PreviewService:
+    """Animated GIF, animated WebP and looping MP4 teaser exports for share previews
+
+    The edit (trim, overlays, vertical crop) goes through the frame pipeline
+    once, into a small lossless master cached under {preview_cache_path}/{key}/
+    together with the GIF palettes made from it. Every format is a
+    cheap re-encode of that master, so exporting a second format, or the same
+    edit again, never decodes the source.
+    """
+
+    def __init__(self):
+        self.cache_path = settings.preview_cache_path
+        # Per-key lock and the number of requests holding or waiting on it
+        self._locks: Dict[str, list] = {}
+        self._last_purge = 0.0
+
+    def _cache_key(
+        self,
+        source_id: str,
+        start_time: float,
+        end_time: Optional[float],
+        text_overlays: Optional[List[Dict]],
+        to_vertical: bool
+    ) -> str:
+        edit = [source_id, start_time, end_time, text_overlays or [], to_vertical, MASTER_WIDTH, MASTER_FPS]
+        return hashlib.sha256(json.dumps(edit, sort_keys=True).encode()).hexdigest()[:32]
+
+    def _master_resolution(self, filepath: str, to_vertical: bool) -> str:
+        if to_vertical:
+            height = round(MASTER_WIDTH * 16 / 9 / 2) * 2
+        else:
+            source_w, source_h = probe_video_size(filepath)
+            height = round(MASTER_WIDTH * source_h / source_w / 2) * 2
+        return f"{MASTER_WIDTH}x{height}"
+
+    @traced('preview.master')
+    def _master(
+        self,
+        directory: str,
+        filepath: str,
+        start_time: float,
+        end_time: Optional[float],
+        text_overlays: Optional[List[Dict]],
+        to_vertical: bool
+    ) -> str:
+        """Cached lossless render of the edit at preview size"""
+        master = os.path.join(directory, 'master.mkv')
+        if os.path.exists(master):
+            os.utime(directory)
+            return master
+
+        os.makedirs(directory, exist_ok=True)
+        end = end_time if end_time is not None else probe_duration(filepath)
+        partial = os.path.join(directory, f"master.{uuid.uuid4().hex}.mkv")
+
+        frame_pipeline.render({
+            'source': filepath,
+            'start': start_time,
+            'end': min(end, start_time + MASTER_DURATION),
+            'overlays': text_overlays,
+            'resolution': self._master_resolution(filepath, to_vertical),
+            'fps': MASTER_FPS,
+            'audio': False,
+            'vcodec': 'ffv1',
+            'pix_fmt': 'bgr0',
+            'output_path': partial
+        })
+        os.replace(partial, master)
+        return master
+
+    def _frames_filter(self, spec: Dict) -> str:
+        return f"fps={spec['fps']},scale={spec['width']}:-2:flags=lanczos"
+
+    @traced('preview.palette')
+    def _palette(self, directory: str, master: str, spec: Dict) -> str:
+        """GIF palette for the master at spec's size and rate (first of the two passes)"""
+        palette = os.path.join(directory, f"palette_{spec['width']}_{spec['fps']}_{spec['colors']}.png")
+        if os.path.exists(palette):
+            return palette
+
+        partial = os.path.join(directory, f"palette.{uuid.uuid4().hex}.png")
+        _run_ffmpeg([
+            settings.ffmpeg_binary, '-y', '-v', 'error',
+            '-t', str(spec['max_duration']), '-i', master,
+            '-vf', f"{self._frames_filter(spec)},palettegen=max_colors={spec['colors']}:stats_mode=diff",
+            partial
+        ], "building GIF palette")
+        os.replace(partial, palette)
+        return palette
+
+    @traced('preview.encode')
+    def _encode(self, directory: str, master: str, name: str) -> str:
+        spec = PREVIEW_FORMATS[name]
+        output_path = f"{settings.temp_storage_path}/{uuid.uuid4()}_preview.{spec['ext']}"
+        command = [
+            settings.ffmpeg_binary, '-y', '-v', 'error',
+            '-t', str(spec['max_duration']), '-i', master
+        ]
+
+        if name == 'gif':
+            palette = self._palette(directory, master, spec)
+            command += [
+                '-i', palette,
+                '-filter_complex',
+                f"[0:v]{self._frames_filter(spec)}[frames];"
+                f"[frames][1:v]paletteuse=dither=bayer:bayer_scale=5:diff_mode=rectangle",
+                '-loop', '0'
+            ]
+        elif name == 'webp':
+            command += [
+                '-vf', self._frames_filter(spec),
+                '-c:v', 'libwebp', '-lossless', '0', '-q:v', str(spec['quality']),
+                '-loop', '0'
+            ]
+        else:
+            # Muted, small and fast-starting; players loop it
+            command += [
+                '-vf', f"{self._frames_filter(spec)},format=yuv420p",
+                '-c:v', 'libx264', '-preset', 'veryfast',
+                '-b:v', spec['bitrate'], '-maxrate', spec['bitrate'],
+                '-bufsize', f"{2 * int(spec['bitrate'].rstrip('k'))}k",
+                '-an', '-movflags', '+faststart'
+            ]
+
+        _run_ffmpeg(command + [output_path], f"encoding {name} preview")
+        return output_path
+
+    async def export(
+        self,
+        filepath: str,
+        source_id: str,
+        formats: List[str],
+        start_time: float = 0,
+        end_time: Optional[float] = None,
+        text_overlays: Optional[List[Dict]] = None,
+        to_vertical: bool = True
+    ) -> Dict[str, str]:
+        """Render preview formats of an edit; returns local file paths by format
+
+        source_id identifies the source content (an upload's sha256) so the
+        master can be reused across requests.
+        """
+        unknown = [name for name in formats if name not in PREVIEW_FORMATS]
+        if unknown:
+            raise ValueError(
+                f"Unknown preview format '{unknown[0]}', expected one of {', '.join(PREVIEW_FORMATS)}"
+            )
+
+        try:
+            os.makedirs(self.cache_path, exist_ok=True)
+            self.purge_expired()
+
+            key = self._cache_key(source_id, start_time, end_time, text_overlays, to_vertical)
+            directory = os.path.join(self.cache_path, key)
+            loop = asyncio.get_running_loop()
+
+            # Concurrent exports of the same edit wait for one master
+            entry = self._locks.setdefault(key, [asyncio.Lock(), 0])
+            entry[1] += 1
+            try:
+                async with entry[0]:
+                    master = await loop.run_in_executor(None, with_context(
+                        self._master, directory, filepath, start_time, end_time, text_overlays, to_vertical
+                    ))
+            finally:
+                # Dropped only once nobody is queued on it, so waiters reuse the master
+                entry[1] -= 1
+                if not entry[1]:
+                    self._locks.pop(key, None)
+
+            paths = await asyncio.gather(*[
+                loop.run_in_executor(None, with_context(self._encode, directory, master, name))
+                for name in formats
+            ])
+            return dict(zip(formats, paths))
+        except Exception as e:
+            raise Exception(f"Error exporting preview: {str(e)}")
+
+    def purge_expired(self):
+        """Remove cached masters unused for preview_cache_ttl seconds (at most once per minute)"""
+        now = time.time()
+        if now - self._last_purge < 60:
+            return
+        self._last_purge = now
+        cutoff = now - settings.preview_cache_ttl
+
+        for entry in os.scandir(self.cache_path):
+            try:
+                if entry.is_dir() and entry.stat().st_mtime < cutoff:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+            except FileNotFoundError:
+                continue
+
+
+preview_service = PreviewService()
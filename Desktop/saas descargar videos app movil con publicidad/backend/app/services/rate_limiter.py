@@ -0,0 +1,253 @@
+import asyncio
+import hashlib
+import json
+import logging
+import uuid
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict
+from urllib.parse import urlparse
+from ..config import get_settings
+from ..telemetry import stage_span
+from .redis_client import get_async_redis
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Token bucket, refilled from the Redis clock so every API pod agrees.
+# Returns {allowed, wait_ms}.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1]) / 60000
+local capacity = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = clock[1] * 1000 + math.floor(clock[2] / 1000)
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + (now - ts) * rate)
+local allowed, wait = 0, 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    wait = math.ceil((1 - tokens) / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate) + 1000)
+return {allowed, wait}
+"""
+
+# Counting semaphore as a sorted set of holders scored by lease expiry, so
+# slots held by a crashed pod free themselves.
+SEMAPHORE_ACQUIRE_SCRIPT = """
+local clock = redis.call('TIME')
+local now = clock[1] * 1000 + math.floor(clock[2] / 1000)
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[1]) then
+    redis.call('ZADD', KEYS[1], now + tonumber(ARGV[2]), ARGV[3])
+    redis.call('PEXPIRE', KEYS[1], tonumber(ARGV[2]))
+    return 1
+end
+return 0
+"""
+
+HOST_ALIASES = {
+    'youtu.be': 'youtube.com',
+}
+
+
+class RateLimitExceeded(Exception):
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def upstream_host(url: str) -> str:
+    """Host an extractor request will hit, with mobile/www prefixes folded"""
+    host = (urlparse(url).hostname or '').lower()
+    for prefix in ('www.', 'm.', 'music.'):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    return HOST_ALIASES.get(host, host)
+
+
+class RateLimiter:
+    """Distributed rate limiting and request coalescing on Redis
+
+    Clients get a token bucket per endpoint and are rejected with 429 when
+    it runs dry. Upstream hosts get a token bucket and a concurrency limit;
+    requests wait in line for those instead of failing. Identical in-flight
+    requests are coalesced across all API pods. If Redis is unreachable the
+    limiter fails open so downloads keep working.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    @property
+    def redis(self):
+        return get_async_redis()
+
+    async def _take_token(self, key: str, per_minute: int) -> int:
+        """Take one token; returns 0 on success or the wait in ms"""
+        allowed, wait = await self.redis.eval(
+            TOKEN_BUCKET_SCRIPT, 1, key, per_minute, per_minute
+        )
+        return 0 if allowed else int(wait)
+
+    async def check_client(self, client_id: str, endpoint: str, per_minute: int):
+        """Reject the request if this client has used up its budget"""
+        if not settings.rate_limit_enabled:
+            return
+        from redis.exceptions import RedisError
+
+        try:
+            wait_ms = await self._take_token(f"ratelimit:client:{endpoint}:{client_id}", per_minute)
+        except RedisError as e:
+            logger.warning(f"Rate limiter unavailable, allowing request: {str(e)}")
+            return
+
+        if wait_ms:
+            raise RateLimitExceeded(
+                "Too many requests, please slow down",
+                retry_after=max(1, -(-wait_ms // 1000))
+            )
+
+    @asynccontextmanager
+    async def upstream(self, url: str):
+        """Hold a rate and concurrency slot for the url's upstream host
+
+        Waits (queues) up to upstream_queue_timeout before giving up.
+        """
+        if not settings.rate_limit_enabled:
+            yield
+            return
+        from redis.exceptions import RedisError
+
+        host = upstream_host(url)
+        bucket_key = f"ratelimit:upstream:{host}"
+        slots_key = f"ratelimit:upstream-slots:{host}"
+        holder = str(uuid.uuid4())
+        lease_ms = int(settings.upstream_slot_lease * 1000)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.upstream_queue_timeout
+        acquired = False
+
+        # Time spent queueing for the upstream shows up as its own stage
+        with stage_span('ratelimit.upstream_wait', upstream_host=host):
+            try:
+                delay = 0.05
+                while True:
+                    wait_ms = await self._take_token(bucket_key, settings.upstream_requests_per_minute)
+                    if not wait_ms:
+                        break
+                    if loop.time() + wait_ms / 1000 > deadline:
+                        raise RateLimitExceeded(f"{host} is busy, try again shortly", retry_after=max(1, wait_ms // 1000))
+                    await asyncio.sleep(wait_ms / 1000)
+
+                while not await self.redis.eval(
+                    SEMAPHORE_ACQUIRE_SCRIPT, 1, slots_key,
+                    settings.upstream_max_concurrency, lease_ms, holder
+                ):
+                    if loop.time() + delay > deadline:
+                        raise RateLimitExceeded(f"{host} is busy, try again shortly", retry_after=5)
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, 1.0)
+                acquired = True
+            except RedisError as e:
+                logger.warning(f"Rate limiter unavailable, skipping upstream limit: {str(e)}")
+
+        try:
+            yield
+        finally:
+            if acquired:
+                try:
+                    await self.redis.zrem(slots_key, holder)
+                except RedisError as e:
+                    logger.warning(f"Could not release upstream slot: {str(e)}")
+
+    async def coalesce(self, key: str, producer: Callable[[], Awaitable[Dict]]) -> Dict:
+        """Run producer once for concurrent identical requests across pods
+
+        The first caller takes a Redis lock and publishes its result; the
+        others wait for that result. If the leader fails, a waiter takes over.
+        """
+        digest = hashlib.sha1(key.encode()).hexdigest()
+
+        # Same-pod duplicates share a future and never touch Redis
+        if digest in self._inflight:
+            return await asyncio.shield(self._inflight[digest])
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[digest] = future
+        try:
+            result = await self._coalesce_distributed(digest, producer)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            # Nobody else may be awaiting; mark the exception as retrieved
+            future.exception()
+            raise
+        finally:
+            del self._inflight[digest]
+            if not future.done():
+                # Leader was cancelled; let local waiters stop waiting too
+                future.cancel()
+
+    async def _coalesce_distributed(self, digest: str, producer: Callable[[], Awaitable[Dict]]) -> Dict:
+        if not settings.rate_limit_enabled:
+            return await producer()
+        from redis.exceptions import RedisError
+
+        result_key = f"coalesce:result:{digest}"
+        lock_key = f"coalesce:lock:{digest}"
+        token = str(uuid.uuid4())
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.coalesce_wait_timeout
+
+        try:
+            while True:
+                cached = await self.redis.get(result_key)
+                if cached:
+                    return json.loads(cached)
+
+                if await self.redis.set(lock_key, token, nx=True, px=int(settings.coalesce_wait_timeout * 1000)):
+                    break
+
+                if loop.time() > deadline:
+                    raise RateLimitExceeded("Request is still being processed, try again shortly", retry_after=5)
+                await asyncio.sleep(0.25)
+        except RedisError as e:
+            logger.warning(f"Coalescing unavailable, running request directly: {str(e)}")
+            return await producer()
+
+        try:
+            result = await producer()
+            try:
+                await self.redis.set(result_key, json.dumps(result), ex=settings.coalesce_result_ttl)
+            except RedisError as e:
+                logger.warning(f"Could not share coalesced result: {str(e)}")
+            return result
+        finally:
+            try:
+                if await self.redis.get(lock_key) == token.encode():
+                    await self.redis.delete(lock_key)
+            except RedisError as e:
+                logger.warning(f"Could not release coalescing lock: {str(e)}")
+
+
+def client_id(request) -> str:
+    """Identify the caller by the address our own proxies saw
+
+    Each of the trusted_proxy_count proxies appends the peer it received the
+    request from, so the client is that many hops from the right. Anything
+    further left was sent by the client and can't be trusted.
+    """
+    if settings.trusted_proxy_count > 0:
+        hops = [hop.strip() for hop in request.headers.get('x-forwarded-for', '').split(',') if hop.strip()]
+        if len(hops) >= settings.trusted_proxy_count:
+            return hops[-settings.trusted_proxy_count]
+    return request.client.host if request.client else 'unknown'
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,24 @@
+from ..config import get_settings
+
+settings = get_settings()
+
+_async_client = None
+_sync_client = None
+
+
+def get_async_redis():
+    """Shared asyncio Redis client for the API process, created on first use"""
+    global _async_client
+    if _async_client is None:
+        import redis.asyncio as redis
+        _async_client = redis.from_url(settings.redis_url)
+    return _async_client
+
+
+def get_redis():
+    """Shared blocking Redis client for workers and consumers"""
+    global _sync_client
+    if _sync_client is None:
+        import redis
+        _sync_client = redis.from_url(settings.redis_url)
+    return _sync_client
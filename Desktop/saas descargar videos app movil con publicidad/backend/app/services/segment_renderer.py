@@ -0,0 +1,331 @@
+import asyncio
+import multiprocessing
+import os
+import subprocess
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
+from ..config import get_settings, get_export_profile
+from ..telemetry import traced, with_context
+from .media_probe import probe_duration, probe_keyframes, has_audio_stream
+from . import frame_pipeline
+
+settings = get_settings()
+
+
+def plan_segments(
+    start: float,
+    end: float,
+    keyframes: List[float],
+    target_length: float
+) -> List[Tuple[float, float]]:
+    """Cut [start, end) at keyframes into segments of roughly target_length"""
+    cuts = [start]
+    for keyframe in keyframes:
+        if keyframe <= start or keyframe >= end:
+            continue
+        if keyframe - cuts[-1] >= target_length:
+            cuts.append(keyframe)
+
+    # Fold a short tail into the previous segment
+    if len(cuts) > 1 and end - cuts[-1] < target_length / 2:
+        cuts.pop()
+    cuts.append(end)
+
+    return list(zip(cuts[:-1], cuts[1:]))
+
+
+def shift_overlays(
+    overlays: Optional[List[Dict]],
+    offset: float,
+    length: float
+) -> List[Dict]:
+    """Re-time overlays from edit time to a segment starting at offset"""
+    shifted = []
+    for overlay in overlays or []:
+        start = overlay.get('start', 0)
+        duration = overlay.get('duration')
+        stop = start + duration if duration is not None else float('inf')
+
+        visible_from = max(start, offset)
+        visible_to = min(stop, offset + length)
+        if visible_to <= visible_from:
+            continue
+
+        shifted.append({
+            **overlay,
+            'start': visible_from - offset,
+            'duration': visible_to - visible_from
+        })
+    return shifted
+
+
+def _crop_to_vertical(clip, resolution: str):
+    """Centre-crop and resize a clip to the vertical target resolution"""
+    from moviepy.video.fx.all import crop, resize
+
+    width, height = map(int, resolution.split('x'))
+    target_ratio = width / height
+
+    if clip.w / clip.h > target_ratio:
+        new_width = int(clip.h * target_ratio)
+        x1 = int(clip.w / 2 - new_width / 2)
+        cropped = crop(clip, x1=x1, width=new_width)
+    else:
+        new_height = int(clip.w / target_ratio)
+        y1 = int(clip.h / 2 - new_height / 2)
+        cropped = crop(clip, y1=y1, height=new_height)
+
+    return resize(cropped, height=height)
+
+
+def render_segment(job: Dict) -> str:
+    """Render the video track of one segment to its own file
+
+    Runs in a pool process or a Celery worker, so it only takes plain data.
+    Audio is rendered separately for the whole edit to avoid AAC priming
+    gaps at segment joins.
+    """
+    if settings.render_engine == 'pipeline':
+        return frame_pipeline.render({**job, 'audio': False})
+
+    from moviepy.editor import VideoFileClip, TextClip, CompositeVideoClip
+
+    clip = VideoFileClip(job['source'], audio=False).subclip(job['start'], job['end'])
+    layers = [clip]
+
+    for overlay in job['overlays']:
+        txt_clip = TextClip(
+            overlay.get('text', ''),
+            fontsize=overlay.get('fontsize', 50),
+            color=overlay.get('color', 'white'),
+            font='Arial-Bold',
+            stroke_color='black',
+            stroke_width=2
+        ).set_position(
+            overlay.get('position', ('center', 'bottom'))
+        ).set_start(overlay['start']).set_duration(overlay['duration'])
+        layers.append(txt_clip)
+
+    final_clip = CompositeVideoClip(layers) if len(layers) > 1 else clip
+    if job['resolution']:
+        final_clip = _crop_to_vertical(final_clip, job['resolution'])
+
+    final_clip.write_videofile(
+        job['output_path'],
+        codec='libx264',
+        audio=False,
+        bitrate=job['bitrate'],
+        fps=job['fps'] or clip.fps,
+        threads=job['threads'],
+        logger=None
+    )
+
+    clip.close()
+    final_clip.close()
+
+    return job['output_path']
+
+
+def render_audio(job: Dict) -> Optional[str]:
+    """Render the mixed audio track for the whole edit"""
+    from moviepy.editor import AudioFileClip, CompositeAudioClip
+    from moviepy.audio.fx.all import audio_loop, volumex
+
+    length = job['end'] - job['start']
+    tracks = []
+
+    if job['source_audio']:
+        source = AudioFileClip(job['source'])
+        tracks.append(source.subclip(job['start'], min(job['end'], source.duration)))
+
+    if job['music_path']:
+        music = AudioFileClip(job['music_path'])
+        if music.duration < length:
+            music = audio_loop(music, duration=length)
+        else:
+            music = music.subclip(0, length)
+        tracks.append(volumex(music, job['music_volume']))
+
+    mixed = CompositeAudioClip(tracks) if len(tracks) > 1 else tracks[0]
+    mixed.write_audiofile(job['output_path'], fps=44100, codec='aac', logger=None)
+    mixed.close()
+
+    return job['output_path']
+
+
+@traced('render.concat')
+def concat_segments(segment_paths: List[str], audio_path: Optional[str], output_path: str) -> str:
+    """Join rendered segments without re-encoding and mux the audio track"""
+    list_path = f"{output_path}.txt"
+    with open(list_path, "w") as list_file:
+        for path in segment_paths:
+            list_file.write(f"file '{path}'\n")
+
+    command = [
+        settings.ffmpeg_binary, '-y', '-v', 'error',
+        '-f', 'concat', '-safe', '0', '-i', list_path
+    ]
+    if audio_path:
+        command += ['-i', audio_path, '-map', '0:v', '-map', '1:a']
+    command += ['-c', 'copy', '-movflags', '+faststart', output_path]
+
+    try:
+        subprocess.run(command, capture_output=True, text=True, check=True)
+    except subprocess.CalledProcessError as e:
+        raise Exception(f"Error concatenating segments: {e.stderr.strip()}")
+    finally:
+        os.remove(list_path)
+
+    for path in segment_paths + ([audio_path] if audio_path else []):
+        if os.path.exists(path):
+            os.remove(path)
+
+    return output_path
+
+
+class SegmentRenderer:
+    """Split/render/concat for long edits
+
+    The timeline is cut at source keyframes, each segment is rendered in a
+    process pool (or as Celery subtasks on several render nodes, which then
+    need a shared temp_storage_path) and the results are joined losslessly.
+    """
+
+    def __init__(self):
+        self.temp_path = settings.temp_storage_path
+        self.workers = settings.render_workers or os.cpu_count() or 1
+        self._pool = None
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._pool
+
+    def _reset_pool(self):
+        """Drop a pool whose worker died; the next render starts a fresh one"""
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def plan(self, filepath: str, start_time: float, end_time: Optional[float]) -> List[Tuple[float, float]]:
+        """Segments for an edit, a single one when splitting isn't worth it
+
+        The edit ends at end_time, or at the end of the source when it's
+        not set, and never runs past max_video_duration.
+        """
+        duration = probe_duration(filepath)
+        end = min(end_time, duration) if end_time else duration
+        end = min(end, start_time + settings.max_video_duration)
+
+        if settings.parallel_render == 'off' or end - start_time < settings.parallel_render_min_duration:
+            return [(start_time, end)]
+
+        return plan_segments(start_time, end, probe_keyframes(filepath), settings.render_segment_seconds)
+
+    def build_jobs(
+        self,
+        filepath: str,
+        segments: List[Tuple[float, float]],
+        text_overlays: Optional[List[Dict]],
+        music_path: Optional[str],
+        to_vertical: bool,
+        profile: Optional[str]
+    ) -> Tuple[List[Dict], Optional[Dict]]:
+        export_profile = get_export_profile(profile)
+        edit_start = segments[0][0]
+        render_id = uuid.uuid4()
+        threads = max(1, (os.cpu_count() or 1) // min(self.workers, len(segments)))
+
+        segment_jobs = []
+        for index, (start, end) in enumerate(segments):
+            segment_jobs.append({
+                'source': filepath,
+                'start': start,
+                'end': end,
+                'overlays': shift_overlays(text_overlays, start - edit_start, end - start),
+                'resolution': export_profile['resolution'] if to_vertical else None,
+                'bitrate': export_profile['bitrate'] if to_vertical else None,
+                'fps': export_profile['fps'] if to_vertical else None,
+                'threads': threads,
+                'output_path': f"{self.temp_path}/{render_id}_seg{index:03d}.mp4"
+            })
+
+        source_audio = has_audio_stream(filepath)
+        audio_job = None
+        if source_audio or music_path:
+            audio_job = {
+                'source': filepath,
+                'source_audio': source_audio,
+                'start': edit_start,
+                'end': segments[-1][1],
+                'music_path': music_path,
+                'music_volume': 0.3,
+                'output_path': f"{self.temp_path}/{render_id}_audio.m4a"
+            }
+
+        return segment_jobs, audio_job
+
+    @traced('render.segments')
+    async def render(
+        self,
+        filepath: str,
+        segments: List[Tuple[float, float]],
+        text_overlays: Optional[List[Dict]] = None,
+        music_path: Optional[str] = None,
+        to_vertical: bool = True,
+        profile: Optional[str] = None
+    ) -> str:
+        """Render segments in parallel and concatenate them"""
+        segment_jobs, audio_job = self.build_jobs(
+            filepath, segments, text_overlays, music_path, to_vertical, profile
+        )
+        output_path = f"{self.temp_path}/{uuid.uuid4()}_processed.mp4"
+        has_audio = audio_job is not None
+        loop = asyncio.get_running_loop()
+
+        try:
+            if settings.parallel_render == 'celery':
+                from celery import group
+                from ..tasks import render_segment_task, render_audio_task
+
+                signatures = [render_segment_task.s(job) for job in segment_jobs]
+                if has_audio:
+                    signatures.append(render_audio_task.s(audio_job))
+                async_result = group(signatures).apply_async()
+                results = await loop.run_in_executor(None, async_result.get)
+            else:
+                futures = [loop.run_in_executor(self.pool, render_segment, job) for job in segment_jobs]
+                if has_audio:
+                    futures.append(loop.run_in_executor(self.pool, render_audio, audio_job))
+                # Let every job finish before cleaning up after a failed one
+                results = await asyncio.gather(*futures, return_exceptions=True)
+                for result in results:
+                    if isinstance(result, BaseException):
+                        raise result
+
+            segment_paths = results[:len(segment_jobs)]
+            audio_path = results[len(segment_jobs)] if has_audio else None
+
+            return await loop.run_in_executor(
+                None, with_context(concat_segments, segment_paths, audio_path, output_path)
+            )
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                # A render child died (e.g. OOM-killed); don't fail every later render
+                self._reset_pool()
+            partials = [job['output_path'] for job in segment_jobs]
+            if has_audio:
+                partials.append(audio_job['output_path'])
+            for path in partials:
+                if os.path.exists(path):
+                    os.remove(path)
+            raise Exception(f"Error rendering segments: {str(e)}")
+
+
+segment_renderer = SegmentRenderer()
@@ -1,33 +1,50 @@
-import boto3
-from botocore.exceptions import ClientError
 import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 from ..config import get_settings
+from ..telemetry import traced
 import uuid
 
 settings = get_settings()
 
+CONTENT_TYPES = {
+    '.m3u8': 'application/vnd.apple.mpegurl',
+    '.m4s': 'video/iso.segment',
+    '.mp4': 'video/mp4',
+    '.gif': 'image/gif',
+    '.webp': 'image/webp',
+}
+
 
 class StorageService:
     def __init__(self):
-        self.s3_client = None
+        self._s3_client = None
         self.bucket_name = settings.s3_bucket_name
 
+    @property
+    def s3_client(self):
+        """S3 client, built on first use; None when S3 isn't configured"""
         # Initialize S3 client if credentials are provided
-        if settings.aws_access_key_id and settings.aws_secret_access_key:
-            self.s3_client = boto3.client(
+        if self._s3_client is None and settings.aws_access_key_id and settings.aws_secret_access_key:
+            import boto3
+            self._s3_client = boto3.client(
                 's3',
                 aws_access_key_id=settings.aws_access_key_id,
                 aws_secret_access_key=settings.aws_secret_access_key,
                 region_name=settings.aws_region
             )
+        return self._s3_client
 
+    @traced('s3.upload')
     async def upload_file(self, filepath: str, object_name: Optional[str] = None) -> str:
         """Upload file to S3 and return public URL"""
         if not self.s3_client:
             # Fallback to local storage if S3 not configured
             return f"/tmp/videos/{os.path.basename(filepath)}"
 
+        from botocore.exceptions import ClientError
+
         if object_name is None:
             object_name = f"videos/{uuid.uuid4()}_{os.path.basename(filepath)}"
 
@@ -36,7 +53,10 @@ class StorageService:
                 filepath,
                 self.bucket_name,
                 object_name,
-                ExtraArgs={'ContentType': 'video/mp4', 'ACL': 'public-read'}
+                ExtraArgs={
+                    'ContentType': CONTENT_TYPES.get(os.path.splitext(filepath)[1], 'video/mp4'),
+                    'ACL': 'public-read'
+                }
             )
 
             # Generate public URL
@@ -45,11 +65,56 @@ class StorageService:
         except ClientError as e:
             raise Exception(f"Error uploading to S3: {str(e)}")
 
+    @traced('s3.upload_directory')
+    async def upload_directory(self, directory: str, prefix: Optional[str] = None) -> str:
+        """Upload every file in a directory to S3 in parallel and return the base URL
+
+        Used for HLS packages; the local copy is removed once uploaded.
+        """
+        dirname = os.path.basename(directory.rstrip('/'))
+        if not self.s3_client:
+            # Fallback to local storage if S3 not configured
+            return f"/tmp/videos/{dirname}"
+
+        from botocore.exceptions import ClientError
+
+        if prefix is None:
+            prefix = f"videos/{uuid.uuid4()}_{dirname}"
+
+        uploads = []
+        for root, _, files in os.walk(directory):
+            for filename in files:
+                local_path = os.path.join(root, filename)
+                key = f"{prefix}/{os.path.relpath(local_path, directory)}"
+                uploads.append((local_path, key))
+
+        def upload(item):
+            local_path, key = item
+            content_type = CONTENT_TYPES.get(os.path.splitext(local_path)[1], 'application/octet-stream')
+            self.s3_client.upload_file(
+                local_path,
+                self.bucket_name,
+                key,
+                ExtraArgs={'ContentType': content_type, 'ACL': 'public-read'}
+            )
+
+        try:
+            with ThreadPoolExecutor(max_workers=settings.upload_concurrency) as executor:
+                list(executor.map(upload, uploads))
+        except ClientError as e:
+            raise Exception(f"Error uploading to S3: {str(e)}")
+
+        shutil.rmtree(directory, ignore_errors=True)
+        return f"https://{self.bucket_name}.s3.{settings.aws_region}.amazonaws.com/{prefix}"
+
+    @traced('s3.presign')
     async def generate_presigned_url(self, object_name: str, expiration: int = 3600) -> str:
         """Generate presigned URL for temporary access"""
         if not self.s3_client:
             return f"/tmp/videos/{object_name}"
 
+        from botocore.exceptions import ClientError
+
         try:
             url = self.s3_client.generate_presigned_url(
                 'get_object',
@@ -60,6 +125,7 @@ class StorageService:
         except ClientError as e:
             raise Exception(f"Error generating presigned URL: {str(e)}")
 
+    @traced('s3.delete')
     async def delete_file(self, object_name: str) -> bool:
         """Delete file from S3"""
         if not self.s3_client:
@@ -70,6 +136,8 @@ class StorageService:
             except:
                 return False
 
+        from botocore.exceptions import ClientError
+
         try:
             self.s3_client.delete_object(Bucket=self.bucket_name, Key=object_name)
             return True
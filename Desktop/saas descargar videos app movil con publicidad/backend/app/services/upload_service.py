@@ -0,0 +1,298 @@
+import asyncio
+import fcntl
+import hashlib
+import hmac
+import json
+import os
+import re
+import secrets
+import time
+import uuid
+from typing import AsyncIterator, Dict, Optional
+from ..config import get_settings
+from ..telemetry import traced, with_context
+
+settings = get_settings()
+
+UPLOAD_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+SHA256_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+# Bytes of the file a client hashes to prove it has it
+CHALLENGE_SIZE = 64 * 1024
+
+
+class UploadNotFound(Exception):
+    pass
+
+
+class UploadConflict(Exception):
+    """The request doesn't fit the upload's state (wrong offset, busy, incomplete...)"""
+
+    def __init__(self, message: str, offset: int = 0):
+        super().__init__(message)
+        self.offset = offset
+
+
+class UploadService:
+    """Resumable, content-addressed uploads (create, append at offset, finalize)
+
+    Partial data lives in {upload_storage_path}/{upload_id}.part and the
+    offset is simply its size, so an interrupted PATCH keeps whatever bytes
+    arrived. Finalized files are stored once per SHA-256 under blobs/. An
+    upload created with the hash of a file we already have gets a challenge
+    instead: the hash of a random byte range of it, which only a client
+    holding the file can answer. Answering it completes the upload without
+    sending the file; a wrong answer means uploading it like any other.
+    """
+
+    def __init__(self):
+        self.root = settings.upload_storage_path
+        self.blob_dir = os.path.join(self.root, 'blobs')
+        self._last_purge = 0.0
+
+    def _record_path(self, upload_id: str) -> str:
+        return os.path.join(self.root, f"{upload_id}.json")
+
+    def _part_path(self, upload_id: str) -> str:
+        return os.path.join(self.root, f"{upload_id}.part")
+
+    def _blob_path(self, sha256: str) -> str:
+        return os.path.join(self.blob_dir, sha256)
+
+    def _load(self, upload_id: str) -> Dict:
+        if not UPLOAD_ID_PATTERN.match(upload_id or ''):
+            raise UploadNotFound(f"Upload {upload_id} not found")
+        try:
+            with open(self._record_path(upload_id)) as record_file:
+                return json.load(record_file)
+        except FileNotFoundError:
+            raise UploadNotFound(f"Upload {upload_id} not found")
+
+    def _save(self, record: Dict):
+        # Write then rename so readers never see a half-written record
+        path = self._record_path(record['upload_id'])
+        with open(f"{path}.tmp", 'w') as record_file:
+            json.dump(record, record_file)
+        os.replace(f"{path}.tmp", path)
+
+    def _offset(self, record: Dict) -> int:
+        if record['complete']:
+            return record['length']
+        try:
+            return os.path.getsize(self._part_path(record['upload_id']))
+        except FileNotFoundError:
+            return 0
+
+    def status(self, upload_id: str) -> Dict:
+        record = self._load(upload_id)
+        challenge = record.get('challenge') if not record['complete'] else None
+        return {
+            'upload_id': record['upload_id'],
+            'offset': self._offset(record),
+            'length': record['length'],
+            'complete': record['complete'],
+            'sha256': record['sha256'] if record['complete'] else None,
+            'deduplicated': record.get('deduplicated', False),
+            'challenge_offset': challenge['offset'] if challenge else None,
+            'challenge_length': challenge['length'] if challenge else None,
+        }
+
+    def create(self, length: int, filename: str, sha256: Optional[str] = None) -> Dict:
+        """Start an upload; challenges the client when a file with sha256 is already stored"""
+        if length <= 0 or length > settings.max_upload_size:
+            raise ValueError(f"Upload length must be between 1 and {settings.max_upload_size} bytes")
+        if sha256 is not None:
+            sha256 = sha256.lower()
+            if not SHA256_PATTERN.match(sha256):
+                raise ValueError("sha256 must be a hex-encoded SHA-256 digest")
+
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self.purge_expired()
+
+        record = {
+            'upload_id': uuid.uuid4().hex,
+            'length': length,
+            'filename': os.path.basename(filename or 'upload'),
+            'sha256': sha256,
+            'created': time.time(),
+            'complete': False,
+        }
+
+        blob = self._blob_path(sha256) if sha256 else None
+        if blob and os.path.exists(blob) and os.path.getsize(blob) == length:
+            # Knowing the hash isn't proof of having the file; a range picked here is
+            size = min(length, CHALLENGE_SIZE)
+            record['challenge'] = {'offset': secrets.randbelow(length - size + 1), 'length': size}
+
+        open(self._part_path(record['upload_id']), 'wb').close()
+        self._save(record)
+        return self.status(record['upload_id'])
+
+    async def append(self, upload_id: str, offset: int, chunks: AsyncIterator[bytes]) -> Dict:
+        """Write a chunk stream at offset; bytes received before a disconnect are kept"""
+        record = self._load(upload_id)
+        if record['complete']:
+            raise UploadConflict("Upload is already complete", record['length'])
+
+        with open(self._part_path(upload_id), 'ab') as part:
+            # One writer per upload, across workers and pods sharing the volume
+            try:
+                fcntl.flock(part, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise UploadConflict("Another chunk is being written to this upload", self._offset(record))
+
+            current = part.seek(0, os.SEEK_END)
+            if offset != current:
+                raise UploadConflict(f"Upload is at offset {current}, not {offset}", current)
+
+            remaining = record['length'] - current
+            try:
+                async for chunk in chunks:
+                    if len(chunk) > remaining:
+                        part.write(chunk[:remaining])
+                        raise UploadConflict("Chunk goes past the declared upload length", record['length'])
+                    part.write(chunk)
+                    remaining -= len(chunk)
+            finally:
+                part.flush()
+
+        return self.status(upload_id)
+
+    def _hash_file(self, path: str) -> str:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as source:
+            for block in iter(lambda: source.read(1024 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _hash_range(self, path: str, offset: int, length: int) -> str:
+        with open(path, 'rb') as source:
+            source.seek(offset)
+            return hashlib.sha256(source.read(length)).hexdigest()
+
+    def verify(self, upload_id: str, range_sha256: str) -> Dict:
+        """Complete an upload from the stored copy once the client answers its challenge
+
+        The challenge is single use: after a wrong answer the file has to be uploaded.
+        """
+        record = self._load(upload_id)
+        if record['complete']:
+            return self.status(upload_id)
+
+        challenge = record.pop('challenge', None)
+        if not challenge:
+            raise UploadConflict("Upload has no pending challenge", self._offset(record))
+
+        blob = self._blob_path(record['sha256'])
+        try:
+            expected = self._hash_range(blob, challenge['offset'], challenge['length'])
+        except FileNotFoundError:
+            expected = None
+
+        if expected is None or not hmac.compare_digest(expected, (range_sha256 or '').lower()):
+            self._save(record)
+            raise ValueError("Challenge answer doesn't match, upload the file instead")
+
+        os.utime(blob)
+        try:
+            os.remove(self._part_path(upload_id))
+        except FileNotFoundError:
+            pass
+        record.update(complete=True, deduplicated=True)
+        self._save(record)
+        return self.status(upload_id)
+
+    @traced('upload.finalize')
+    async def finalize(self, upload_id: str) -> Dict:
+        """Check and hash a fully received upload and file it under its SHA-256"""
+        record = self._load(upload_id)
+        if record['complete']:
+            return self.status(upload_id)
+
+        offset = self._offset(record)
+        if offset != record['length']:
+            raise UploadConflict(f"Upload has {offset} of {record['length']} bytes", offset)
+
+        part_path = self._part_path(upload_id)
+        try:
+            part = open(part_path, 'rb')
+        except FileNotFoundError:
+            # Moved away by a finalize that just completed
+            return self._finalized(upload_id)
+
+        with part:
+            # Same lock as append: no chunk is being written and no other
+            # finalize is hashing or moving this file
+            try:
+                fcntl.flock(part, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                raise UploadConflict("Upload is being written or finalized", offset)
+
+            record = self._load(upload_id)
+            if record['complete']:
+                return self.status(upload_id)
+
+            loop = asyncio.get_running_loop()
+            sha256 = await loop.run_in_executor(None, with_context(self._hash_file, part_path))
+            if record['sha256'] and record['sha256'] != sha256:
+                os.remove(part_path)
+                self._delete_record(upload_id)
+                raise ValueError("Uploaded data doesn't match the declared sha256")
+
+            blob = self._blob_path(sha256)
+            deduplicated = os.path.exists(blob)
+            if deduplicated:
+                os.remove(part_path)
+                os.utime(blob)
+            else:
+                os.replace(part_path, blob)
+
+            record.pop('challenge', None)
+            record.update(sha256=sha256, complete=True, deduplicated=deduplicated)
+            self._save(record)
+        return self.status(upload_id)
+
+    def _finalized(self, upload_id: str) -> Dict:
+        record = self._load(upload_id)
+        if not record['complete']:
+            raise UploadConflict("Upload data is missing", 0)
+        return self.status(upload_id)
+
+    def get_path(self, upload_id: str) -> str:
+        """Local path of a finalized upload, for the edit endpoints"""
+        record = self._load(upload_id)
+        if not record['complete']:
+            raise UploadConflict("Upload is not finalized yet", self._offset(record))
+
+        blob = self._blob_path(record['sha256'])
+        if not os.path.exists(blob):
+            raise UploadNotFound(f"Upload {upload_id} has expired")
+        # Keeps uploads that are still being edited from expiring
+        os.utime(blob)
+        os.utime(self._record_path(upload_id))
+        return blob
+
+    def _delete_record(self, upload_id: str):
+        try:
+            os.remove(self._record_path(upload_id))
+        except FileNotFoundError:
+            pass
+
+    def purge_expired(self):
+        """Remove uploads and blobs untouched for upload_ttl seconds (at most once per minute)"""
+        now = time.time()
+        if now - self._last_purge < 60:
+            return
+        self._last_purge = now
+        cutoff = now - settings.upload_ttl
+
+        for directory in (self.root, self.blob_dir):
+            for entry in os.scandir(directory):
+                try:
+                    if entry.is_file() and entry.stat().st_mtime < cutoff:
+                        os.remove(entry.path)
+                except FileNotFoundError:
+                    continue
+
+
+upload_service = UploadService()
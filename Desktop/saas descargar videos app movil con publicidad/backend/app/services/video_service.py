@@ -1,21 +1,41 @@
+import asyncio
 import os
 from typing import Optional, List, Dict
-from moviepy.editor import VideoFileClip, TextClip, CompositeVideoClip, AudioFileClip, concatenate_videoclips
-from moviepy.video.fx import resize, crop
-from ..config import get_settings
+from ..config import get_settings, get_export_profile
+from ..telemetry import traced
+from .segment_renderer import segment_renderer
+from . import frame_pipeline
+from .media_probe import probe_duration
 import uuid
 
 settings = get_settings()
 
 
 class VideoService:
+    """Render operations on local files
+
+    moviepy is imported inside each method so that importing this module
+    (the API process does, through the routers) doesn't load the render stack.
+    With render_engine 'pipeline', compositing and vertical conversion go
+    through frame_pipeline instead of moviepy.
+    """
+
     def __init__(self):
         self.temp_path = settings.temp_storage_path
+
+    @traced('render.pipeline')
+    async def _render_pipeline(self, job: Dict) -> str:
         os.makedirs(self.temp_path, exist_ok=True)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, frame_pipeline.render, job)
 
+    @traced('video.trim')
     async def trim_video(self, filepath: str, start_time: float, end_time: float) -> str:
         """Trim video to specified duration"""
+        from moviepy.editor import VideoFileClip
+
         try:
+            os.makedirs(self.temp_path, exist_ok=True)
             clip = VideoFileClip(filepath)
 
             # Ensure duration is within limits
@@ -34,9 +54,23 @@ class VideoService:
         except Exception as e:
             raise Exception(f"Error trimming video: {str(e)}")
 
+    @traced('video.text_overlay')
     async def add_text_overlay(self, filepath: str, text_overlays: List[Dict]) -> str:
         """Add text overlays to video"""
+        if settings.render_engine == 'pipeline':
+            try:
+                return await self._render_pipeline({
+                    'source': filepath,
+                    'overlays': text_overlays,
+                    'output_path': f"{self.temp_path}/{uuid.uuid4()}_text.mp4"
+                })
+            except Exception as e:
+                raise Exception(f"Error adding text overlay: {str(e)}")
+
+        from moviepy.editor import VideoFileClip, TextClip, CompositeVideoClip
+
         try:
+            os.makedirs(self.temp_path, exist_ok=True)
             clip = VideoFileClip(filepath)
             clips_to_composite = [clip]
 
@@ -71,9 +105,13 @@ class VideoService:
         except Exception as e:
             raise Exception(f"Error adding text overlay: {str(e)}")
 
+    @traced('video.music')
     async def add_background_music(self, filepath: str, music_path: str, volume: float = 0.3) -> str:
         """Add background music to video"""
+        from moviepy.editor import VideoFileClip, AudioFileClip, CompositeAudioClip
+
         try:
+            os.makedirs(self.temp_path, exist_ok=True)
             video_clip = VideoFileClip(filepath)
             audio_clip = AudioFileClip(music_path)
 
@@ -105,9 +143,31 @@ class VideoService:
         except Exception as e:
             raise Exception(f"Error adding music: {str(e)}")
 
-    async def convert_to_vertical(self, filepath: str, target_resolution: str = "1080x1920") -> str:
+    @traced('video.vertical')
+    async def convert_to_vertical(
+        self,
+        filepath: str,
+        target_resolution: Optional[str] = None,
+        profile: Optional[str] = None
+    ) -> str:
         """Convert video to vertical format (9:16) for TikTok/Reels"""
         try:
+            os.makedirs(self.temp_path, exist_ok=True)
+            export_profile = get_export_profile(profile)
+            target_resolution = target_resolution or export_profile['resolution']
+
+            if settings.render_engine == 'pipeline':
+                return await self._render_pipeline({
+                    'source': filepath,
+                    'resolution': target_resolution,
+                    'bitrate': export_profile['bitrate'],
+                    'fps': export_profile['fps'],
+                    'output_path': f"{self.temp_path}/{uuid.uuid4()}_vertical.mp4"
+                })
+
+            from moviepy.editor import VideoFileClip
+            from moviepy.video.fx.all import resize, crop
+
             clip = VideoFileClip(filepath)
 
             width, height = map(int, target_resolution.split('x'))
@@ -137,8 +197,8 @@ class VideoService:
                 output_path,
                 codec='libx264',
                 audio_codec='aac',
-                bitrate='5000k',
-                fps=30
+                bitrate=export_profile['bitrate'],
+                fps=export_profile['fps']
             )
 
             clip.close()
@@ -149,6 +209,7 @@ class VideoService:
         except Exception as e:
             raise Exception(f"Error converting to vertical: {str(e)}")
 
+    @traced('video.process')
     async def process_video(
         self,
         filepath: str,
@@ -156,15 +217,46 @@ class VideoService:
         end_time: Optional[float] = None,
         text_overlays: Optional[List[Dict]] = None,
         music_path: Optional[str] = None,
-        to_vertical: bool = True
+        to_vertical: bool = True,
+        profile: Optional[str] = None
     ) -> str:
         """Process video with all requested edits"""
         try:
+            # Long edits are split at keyframes and rendered in parallel
+            segments = segment_renderer.plan(filepath, start_time, end_time)
+            if len(segments) > 1:
+                return await segment_renderer.render(
+                    filepath,
+                    segments,
+                    text_overlays=text_overlays,
+                    music_path=music_path,
+                    to_vertical=to_vertical,
+                    profile=profile
+                )
+
+            start, end = segments[0]
+
+            # One decode/encode pass for every edit at once
+            if settings.render_engine == 'pipeline':
+                export_profile = get_export_profile(profile)
+                return await self._render_pipeline({
+                    'source': filepath,
+                    'start': start,
+                    'end': end,
+                    'overlays': text_overlays,
+                    'music_path': music_path,
+                    'music_volume': 0.3,
+                    'resolution': export_profile['resolution'] if to_vertical else None,
+                    'bitrate': export_profile['bitrate'] if to_vertical else None,
+                    'fps': export_profile['fps'] if to_vertical else None,
+                    'output_path': f"{self.temp_path}/{uuid.uuid4()}_processed.mp4"
+                })
+
             current_file = filepath
 
             # Trim video
-            if end_time:
-                current_file = await self.trim_video(current_file, start_time, end_time)
+            if start > 0 or end < probe_duration(filepath):
+                current_file = await self.trim_video(current_file, start, end)
 
             # Add text overlays
             if text_overlays:
@@ -176,7 +268,7 @@ class VideoService:
 
             # Convert to vertical format
             if to_vertical:
-                current_file = await self.convert_to_vertical(current_file)
+                current_file = await self.convert_to_vertical(current_file, profile=profile)
 
             return current_file
         except Exception as e:
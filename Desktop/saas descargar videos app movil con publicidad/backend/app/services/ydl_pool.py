@@ -0,0 +1,107 @@
+import json
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+from ..config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+def _snapshot(params: Dict) -> Dict:
+    """Copy of a params dict deep enough to undo per-call changes"""
+    return {key: dict(value) if isinstance(value, dict) else value for key, value in params.items()}
+
+
+class YDLPool:
+    """Long-lived, pre-warmed YoutubeDL instances keyed by option set
+
+    Reusing an instance keeps its extractor objects, and with them the
+    player JS and signature function caches, as well as its cookie jar and
+    persistent HTTP connections. Each instance is checked out by one caller
+    at a time; per-call parameter changes are rolled back on release.
+    """
+
+    def __init__(self, size: Optional[int] = None, setup: Optional[Callable] = None):
+        self.size = size or settings.ydl_pool_size
+        self.setup = setup
+        self._idle: Dict[str, List] = {}
+        self._created: Dict[str, int] = {}
+        self._baselines: Dict[int, Dict] = {}
+        self._condition = threading.Condition()
+
+    def _base_options(self) -> Dict:
+        return {
+            # On-disk cache for signature/nsig functions, survives restarts
+            'cachedir': settings.ydl_cache_dir,
+        }
+
+    def _key(self, options: Dict) -> str:
+        return json.dumps(options, sort_keys=True, default=repr)
+
+    def _create(self, options: Dict):
+        import yt_dlp
+
+        ydl = yt_dlp.YoutubeDL({**self._base_options(), **options})
+        if self.setup:
+            self.setup(ydl)
+        self._baselines[id(ydl)] = _snapshot(ydl.params)
+        return ydl
+
+    @contextmanager
+    def acquire(self, options: Dict):
+        """Check out an instance for options, waiting if all are in use"""
+        key = self._key(options)
+
+        with self._condition:
+            while True:
+                idle = self._idle.setdefault(key, [])
+                if idle:
+                    ydl = idle.pop()
+                    break
+                if self._created.get(key, 0) < self.size:
+                    self._created[key] = self._created.get(key, 0) + 1
+                    ydl = None
+                    break
+                self._condition.wait()
+
+        if ydl is None:
+            try:
+                ydl = self._create(options)
+            except Exception:
+                with self._condition:
+                    self._created[key] -= 1
+                    self._condition.notify()
+                raise
+
+        try:
+            yield ydl
+        finally:
+            ydl.params.clear()
+            ydl.params.update(_snapshot(self._baselines[id(ydl)]))
+            with self._condition:
+                self._idle[key].append(ydl)
+                self._condition.notify()
+
+    def warm(self, options: Dict, extractors: List[str] = ('Youtube',)):
+        """Create an instance for options ahead of time and initialise extractors"""
+        with self.acquire(options) as ydl:
+            for ie_key in extractors:
+                try:
+                    ydl.get_info_extractor(ie_key).initialize()
+                except Exception as e:
+                    logger.warning(f"Could not warm extractor {ie_key}: {str(e)}")
+
+    def close(self):
+        """Close every idle instance (saves cookies, drops connections)"""
+        with self._condition:
+            for key, idle in self._idle.items():
+                for ydl in idle:
+                    ydl.close()
+                    self._baselines.pop(id(ydl), None)
+                self._created[key] = self._created.get(key, 0) - len(idle)
+                idle.clear()
+
+
+ydl_pool = YDLPool()
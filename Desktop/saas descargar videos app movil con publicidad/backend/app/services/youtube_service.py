@@ -1,21 +1,44 @@
-import yt_dlp
+import asyncio
 import os
-from typing import Dict
-from ..config import get_settings
+from typing import Dict, Optional, Tuple
+from ..config import get_settings, get_export_profile, EXPORT_PROFILES
+from .ydl_pool import ydl_pool
+from ..telemetry import stage_span, traced, with_context
 
 settings = get_settings()
 
 
 class YouTubeService:
+    """yt-dlp wrapper; downloaders come from ydl_pool, built on first use"""
+
     def __init__(self):
         self.temp_path = settings.temp_storage_path
-        os.makedirs(self.temp_path, exist_ok=True)
 
-    async def download_video(self, url: str) -> Dict:
-        """Download video from YouTube and return metadata"""
+    def _format_options(self, profile: Dict) -> Dict:
+        """yt-dlp format options capped at what the export profile renders"""
+        height = profile['max_source_height']
+        tbr = profile['max_source_tbr']
+        limits = f'[height<={height}][tbr<=?{tbr}]'
+        return {
+            'format': (
+                f'bestvideo{limits}+bestaudio/'
+                f'best{limits}/'
+                f'best[height<={height}]/best'
+            ),
+            # Within the caps prefer the resolution we need, at most the
+            # output frame rate, and the codec the local decoder is fastest at
+            'format_sort': [
+                f'res:{height}',
+                f'fps:{profile["fps"]}',
+                f'vcodec:{profile["vcodec"]}',
+                'acodec:aac',
+                'ext:mp4:m4a',
+            ],
+        }
 
-        ydl_opts = {
-            'format': 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best',
+    def _download_options(self, profile: Optional[str] = None) -> Dict:
+        return {
+            **self._format_options(get_export_profile(profile)),
             'outtmpl': f'{self.temp_path}/%(id)s.%(ext)s',
             'merge_output_format': 'mp4',
             'quiet': True,
@@ -23,49 +46,157 @@ class YouTubeService:
             'extract_flat': False,
         }
 
-        try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=True)
+    def _info_options(self) -> Dict:
+        return {
+            'quiet': True,
+            'no_warnings': True,
+            'extract_flat': True,
+        }
+
+    def warm(self):
+        """Pre-build pooled downloaders for the info lookup and every export profile"""
+        ydl_pool.warm(self._info_options())
+        for profile in EXPORT_PROFILES:
+            ydl_pool.warm(self._download_options(profile))
+
+    def _resolve_section(
+        self,
+        duration: float,
+        start_time: Optional[float],
+        end_time: Optional[float]
+    ) -> Optional[Tuple[float, float]]:
+        """Work out which part of the source to fetch, or None for the whole file
+
+        A source that doesn't report its duration is treated like one over
+        the limit, since nothing else bounds how much would be fetched.
+        """
+        max_source = settings.max_video_duration * 2  # Allow 2x for editing
+
+        if start_time is None and end_time is None:
+            if duration and duration <= max_source:
+                return None
+            if settings.long_video_policy == 'reject':
+                if not duration:
+                    raise Exception("Video duration is unknown")
+                raise Exception(
+                    f"Video is too long ({int(duration)}s, max {max_source}s)"
+                )
+            return (0, max_source)
+
+        start = max(start_time or 0, 0)
+        end = end_time if end_time is not None else start + settings.max_video_duration
+        if duration:
+            if start >= duration:
+                raise Exception(f"Start time {start}s is past the end of the video")
+            end = min(end, duration)
+        if end <= start:
+            raise Exception("End time must be greater than start time")
+
+        # Same cap trim_video applies later, no point fetching more than that
+        end = min(end, start + settings.max_video_duration)
+        return (start, end)
+
+    def _download(
+        self,
+        url: str,
+        start_time: Optional[float],
+        end_time: Optional[float],
+        profile: Optional[str]
+    ) -> Dict:
+        """Blocking part of download_video, run in an executor thread"""
+        from yt_dlp.utils import download_range_func
+
+        # Pooled instance; the range/outtmpl changes below are undone on release
+        with ydl_pool.acquire(self._download_options(profile)) as ydl:
+            # Pre-flight: metadata only, no media bytes yet
+            with stage_span('ytdlp.extract_info') as span:
+                info = ydl.extract_info(url, download=False)
+                span.set_attribute('video.id', info.get('id') or '')
+
+            if info.get('is_live'):
+                raise Exception("Live streams can't be downloaded")
+
+            duration = info.get('duration') or 0
+            section = self._resolve_section(duration, start_time, end_time)
 
-                video_id = info['id']
+            if section:
+                ydl.params['download_ranges'] = download_range_func(None, [section])
+                # Re-encode around the cuts so the file starts at section[0],
+                # not at the keyframe before it
+                ydl.params['force_keyframes_at_cuts'] = True
+                ydl.params['outtmpl']['default'] = (
+                    f'{self.temp_path}/%(id)s_{int(section[0])}-{int(section[1])}.%(ext)s'
+                )
+
+            with stage_span('ytdlp.fetch', source_duration=duration) as span:
+                if section:
+                    span.set_attribute('section', list(section))
+                info = ydl.process_ie_result(info, download=True)
+
+            video_id = info['id']
+            downloads = info.get('requested_downloads') or []
+            if downloads and downloads[0].get('filepath'):
+                filepath = downloads[0]['filepath']
+            else:
                 filepath = ydl.prepare_filename(info)
 
-                # Check duration limit
-                duration = info.get('duration', 0)
-                if duration > settings.max_video_duration * 2:  # Allow 2x for editing
-                    # Still download but warn user
-                    pass
-
-                return {
-                    'video_id': video_id,
-                    'title': info.get('title', 'Unknown'),
-                    'duration': duration,
-                    'thumbnail': info.get('thumbnail', ''),
-                    'filepath': filepath,
-                    'original_url': url
-                }
+            return {
+                'video_id': video_id,
+                'title': info.get('title', 'Unknown'),
+                'duration': (section[1] - section[0]) if section else duration,
+                'source_duration': duration,
+                'section_start': section[0] if section else 0,
+                'thumbnail': info.get('thumbnail', ''),
+                'filepath': filepath,
+                'original_url': url
+            }
+
+    @traced('ytdlp.download')
+    async def download_video(
+        self,
+        url: str,
+        start_time: Optional[float] = None,
+        end_time: Optional[float] = None,
+        profile: Optional[str] = None
+    ) -> Dict:
+        """Download video from YouTube and return metadata
+
+        Metadata is resolved first so over-limit sources are rejected or
+        clipped before any media is fetched. When a time range is given only
+        that section is downloaded. The stream is picked to fit the export
+        profile the video will be rendered with.
+
+        yt-dlp blocks, so it runs in the default executor; the event loop
+        keeps serving other requests and ydl_pool_size instances per option
+        set can be busy at once.
+        """
+        os.makedirs(self.temp_path, exist_ok=True)
+
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, with_context(
+                self._download, url, start_time, end_time, profile
+            ))
         except Exception as e:
             raise Exception(f"Error downloading video: {str(e)}")
 
-    async def get_video_info(self, url: str) -> Dict:
-        """Get video information without downloading"""
+    def _info(self, url: str) -> Dict:
+        with ydl_pool.acquire(self._info_options()) as ydl:
+            info = ydl.extract_info(url, download=False)
 
-        ydl_opts = {
-            'quiet': True,
-            'no_warnings': True,
-            'extract_flat': True,
-        }
+            return {
+                'video_id': info['id'],
+                'title': info.get('title', 'Unknown'),
+                'duration': info.get('duration', 0),
+                'thumbnail': info.get('thumbnail', ''),
+            }
 
+    @traced('ytdlp.info')
+    async def get_video_info(self, url: str) -> Dict:
+        """Get video information without downloading"""
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-
-                return {
-                    'video_id': info['id'],
-                    'title': info.get('title', 'Unknown'),
-                    'duration': info.get('duration', 0),
-                    'thumbnail': info.get('thumbnail', ''),
-                }
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, with_context(self._info, url))
         except Exception as e:
             raise Exception(f"Error getting video info: {str(e)}")
 
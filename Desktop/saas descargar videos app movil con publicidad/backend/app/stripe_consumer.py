@@ -0,0 +1,70 @@
+"""Consumer for queued Stripe webhook events
+
+Run one or more alongside the API:
+
+    python -m app.stripe_consumer
+
+Events are read from the Redis stream through a consumer group, applied
+to the entitlement store and acknowledged. Entries left pending by a
+consumer that died are claimed back after stripe_event_claim_idle ms.
+"""
+import logging
+import os
+import socket
+from .config import get_settings
+from .services.redis_client import get_redis
+from .services.entitlements import EVENT_STREAM, CONSUMER_GROUP, apply_event, decode_event
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+
+def ensure_group(redis):
+    from redis.exceptions import ResponseError
+
+    try:
+        redis.xgroup_create(EVENT_STREAM, CONSUMER_GROUP, id='0', mkstream=True)
+    except ResponseError as e:
+        if 'BUSYGROUP' not in str(e):
+            raise
+
+
+def handle(redis, entry_id, fields):
+    try:
+        event_id, event = decode_event(fields)
+        apply_event(redis, event_id, event)
+        redis.xack(EVENT_STREAM, CONSUMER_GROUP, entry_id)
+    except Exception as e:
+        # Left pending; claimed and retried later
+        logger.error(f"Error applying Stripe event {entry_id}: {str(e)}")
+
+
+def run(consumer_name: str = None):
+    redis = get_redis()
+    consumer_name = consumer_name or f"{socket.gethostname()}-{os.getpid()}"
+    ensure_group(redis)
+    logger.info(f"Stripe consumer {consumer_name} reading {EVENT_STREAM}")
+
+    while True:
+        claimed = redis.xautoclaim(
+            EVENT_STREAM, CONSUMER_GROUP, consumer_name,
+            min_idle_time=settings.stripe_event_claim_idle, start_id='0-0', count=50
+        )[1]
+        for entry_id, fields in claimed:
+            handle(redis, entry_id, fields)
+
+        response = redis.xreadgroup(
+            CONSUMER_GROUP, consumer_name, {EVENT_STREAM: '>'}, count=50, block=5000
+        )
+        for _, entries in response or []:
+            for entry_id, fields in entries:
+                handle(redis, entry_id, fields)
+
+
+if __name__ == "__main__":
+    run()
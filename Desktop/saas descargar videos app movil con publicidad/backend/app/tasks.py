@@ -1,15 +1,27 @@
+import asyncio
 from .celery_app import celery_app
-from .services import youtube_service, video_service, storage_service
+from .services import youtube_service, video_service, storage_service, packaging_service
+from .services.segment_renderer import render_segment, render_audio
 import logging
 
 logger = logging.getLogger(__name__)
 
 
 @celery_app.task(name='download_video_task')
-def download_video_task(url: str):
+def download_video_task(
+    url: str,
+    start_time: float = None,
+    end_time: float = None,
+    profile: str = None
+):
     """Background task to download video from YouTube"""
     try:
-        result = youtube_service.download_video(url)
+        result = asyncio.run(youtube_service.download_video(
+            url,
+            start_time=start_time,
+            end_time=end_time,
+            profile=profile
+        ))
         logger.info(f"Video downloaded: {result['video_id']}")
         return result
     except Exception as e:
@@ -24,18 +36,20 @@ def process_video_task(
     end_time: float = None,
     text_overlays: list = None,
     music_path: str = None,
-    to_vertical: bool = True
+    to_vertical: bool = True,
+    profile: str = None
 ):
     """Background task to process video"""
     try:
-        result = video_service.process_video(
+        result = asyncio.run(video_service.process_video(
             filepath=filepath,
             start_time=start_time,
             end_time=end_time,
             text_overlays=text_overlays,
             music_path=music_path,
-            to_vertical=to_vertical
-        )
+            to_vertical=to_vertical,
+            profile=profile
+        ))
         logger.info(f"Video processed: {result}")
         return result
     except Exception as e:
@@ -43,13 +57,45 @@ def process_video_task(
         raise
 
 
+@celery_app.task(name='render_segment_task')
+def render_segment_task(job: dict):
+    """Render one segment of a split render"""
+    try:
+        return render_segment(job)
+    except Exception as e:
+        logger.error(f"Error rendering segment: {str(e)}")
+        raise
+
+
+@celery_app.task(name='render_audio_task')
+def render_audio_task(job: dict):
+    """Render the audio track of a split render"""
+    try:
+        return render_audio(job)
+    except Exception as e:
+        logger.error(f"Error rendering audio: {str(e)}")
+        raise
+
+
 @celery_app.task(name='upload_to_storage_task')
 def upload_to_storage_task(filepath: str):
     """Background task to upload video to S3"""
     try:
-        url = storage_service.upload_file(filepath)
+        url = asyncio.run(storage_service.upload_file(filepath))
         logger.info(f"Video uploaded to: {url}")
         return url
     except Exception as e:
         logger.error(f"Error uploading to storage: {str(e)}")
         raise
+
+
+@celery_app.task(name='package_hls_task')
+def package_hls_task(filepath: str):
+    """Background task to package a rendered video as HLS"""
+    try:
+        url = asyncio.run(packaging_service.package_and_upload(filepath))
+        logger.info(f"HLS package uploaded to: {url}")
+        return url
+    except Exception as e:
+        logger.error(f"Error packaging HLS: {str(e)}")
+        raise
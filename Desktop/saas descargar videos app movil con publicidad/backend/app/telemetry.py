@@ -0,0 +1,263 @@
+"""Tracing and metrics shared by the API, the Celery workers and the services
+
+Spans follow OpenTelemetry: each process installs a tracer provider with
+setup_tracing() and finished spans go to a local exporter (a JSON-lines
+file by default). Trace context crosses into Celery through the task
+message headers, so a request, the tasks it queued and the stages they
+ran share one trace id.
+
+Histograms are kept with prometheus_client and served by /metrics. Set
+PROMETHEUS_MULTIPROC_DIR to a directory shared by the API and the
+workers to have worker-side metrics (task durations, queue wait) show
+up there too. The directory must be emptied before those processes
+start, or files left by old PIDs keep being reported.
+"""
+import contextvars
+import functools
+import inspect
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Sequence, Tuple
+from opentelemetry import context, propagate, trace
+from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+from opentelemetry.trace import SpanKind, Status, StatusCode
+from prometheus_client import Gauge, Histogram
+from .config import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+tracer = trace.get_tracer("video-editor")
+
+STAGE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', 'HTTP request latency',
+    ['method', 'route', 'status'], buckets=STAGE_BUCKETS
+)
+STAGE_DURATION = Histogram(
+    'stage_duration_seconds', 'Time spent in a traced stage (download, render, upload...)',
+    ['stage', 'outcome'], buckets=STAGE_BUCKETS
+)
+TASK_DURATION = Histogram(
+    'celery_task_duration_seconds', 'Celery task run time',
+    ['task', 'state'], buckets=STAGE_BUCKETS
+)
+QUEUE_WAIT = Histogram(
+    'celery_queue_wait_seconds', 'Time between publishing a task and a worker starting it',
+    ['task'], buckets=STAGE_BUCKETS
+)
+QUEUE_LENGTH = Gauge(
+    'celery_queue_length', 'Messages waiting in a Celery queue',
+    ['queue'], multiprocess_mode='livemax'
+)
+
+# Spans of the tasks running in this worker process, by task id
+_task_spans: Dict[str, Tuple] = {}
+
+
+class JsonLinesSpanExporter(SpanExporter):
+    """Appends finished spans to a local file, one JSON object per line"""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    def export(self, spans: Sequence) -> SpanExportResult:
+        lines = ''.join(span.to_json(indent=None) + '\n' for span in spans)
+        try:
+            with open(self.path, 'a') as trace_file:
+                trace_file.write(lines)
+        except OSError as e:
+            logger.warning(f"Could not write spans to {self.path}: {str(e)}")
+            return SpanExportResult.FAILURE
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        pass
+
+
+def current_trace_id() -> str:
+    span_context = trace.get_current_span().get_span_context()
+    return trace.format_trace_id(span_context.trace_id) if span_context.is_valid else '-'
+
+
+def _install_log_context():
+    """Stamp every log record with the current trace id (%(trace_id)s)"""
+    factory = logging.getLogRecordFactory()
+    if getattr(factory, 'adds_trace_id', False):
+        return
+
+    def record_factory(*args, **kwargs):
+        record = factory(*args, **kwargs)
+        record.trace_id = current_trace_id()
+        return record
+
+    record_factory.adds_trace_id = True
+    logging.setLogRecordFactory(record_factory)
+
+
+def setup_tracing(service_name: str):
+    """Install the tracer provider and the local exporter for this process"""
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+    _install_log_context()
+    if settings.trace_exporter == 'none':
+        return
+
+    provider = TracerProvider(
+        resource=Resource.create({'service.name': service_name}),
+        sampler=ParentBased(TraceIdRatioBased(settings.trace_sample_ratio))
+    )
+    if settings.trace_exporter == 'console':
+        exporter = ConsoleSpanExporter()
+    else:
+        exporter = JsonLinesSpanExporter(settings.trace_file)
+    provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(provider)
+
+
+@contextmanager
+def stage_span(stage: str, **attributes):
+    """Span for one stage of the work, also timed into stage_duration_seconds"""
+    started = time.perf_counter()
+    outcome = 'ok'
+    with tracer.start_as_current_span(stage, attributes=attributes) as span:
+        try:
+            yield span
+        except BaseException:
+            outcome = 'error'
+            raise
+        finally:
+            STAGE_DURATION.labels(stage, outcome).observe(time.perf_counter() - started)
+
+
+def with_context(func, *args):
+    """func bound to the current context, so spans it opens in an executor nest correctly"""
+    return functools.partial(contextvars.copy_context().run, func, *args)
+
+
+def traced(stage: str, **attributes):
+    """Decorator running a sync or async function inside stage_span(stage)"""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with stage_span(stage, **attributes):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage_span(stage, **attributes):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+async def trace_request(request, call_next):
+    """HTTP middleware body: server span, request histogram and X-Trace-Id header"""
+    method = request.method
+    started = time.perf_counter()
+    status = 500
+
+    with tracer.start_as_current_span(
+        f"{method} {request.url.path}",
+        context=propagate.extract(request.headers),
+        kind=SpanKind.SERVER,
+        attributes={'http.method': method, 'http.target': request.url.path}
+    ) as span:
+        trace_id = current_trace_id()
+        request.state.trace_id = trace_id
+        try:
+            response = await call_next(request)
+            status = response.status_code
+        finally:
+            # Label by route template, not raw path, to keep cardinality bounded
+            route = getattr(request.scope.get('route'), 'path', 'unmatched')
+            span.update_name(f"{method} {route}")
+            span.set_attribute('http.route', route)
+            span.set_attribute('http.status_code', status)
+            if status >= 500:
+                span.set_status(Status(StatusCode.ERROR))
+            REQUEST_DURATION.labels(method, route, str(status)).observe(time.perf_counter() - started)
+
+    response.headers['X-Trace-Id'] = trace_id
+    return response
+
+
+def inject_task_headers(task_name: str, headers: Dict):
+    """Carry the current trace and the publish time in a Celery message's headers"""
+    with tracer.start_as_current_span(
+        f"celery.publish {task_name}",
+        kind=SpanKind.PRODUCER,
+        attributes={'celery.task_name': task_name}
+    ):
+        propagate.inject(headers)
+    headers['published_at'] = time.time()
+
+
+def start_task_span(task_id: str, task):
+    """Open the worker-side span of a task, continuing the publisher's trace"""
+    request = task.request
+    carrier = {
+        key: getattr(request, key)
+        for key in ('traceparent', 'tracestate')
+        if getattr(request, key, None)
+    }
+
+    published_at = getattr(request, 'published_at', None)
+    if published_at:
+        QUEUE_WAIT.labels(task.name).observe(max(0.0, time.time() - published_at))
+
+    span = tracer.start_span(
+        f"celery.run {task.name}",
+        context=propagate.extract(carrier),
+        kind=SpanKind.CONSUMER,
+        attributes={'celery.task_name': task.name, 'celery.task_id': task_id}
+    )
+    token = context.attach(trace.set_span_in_context(span))
+    _task_spans[task_id] = (span, token, task.name, time.perf_counter())
+
+
+def fail_task_span(task_id: str, exception: BaseException):
+    entry = _task_spans.get(task_id)
+    if entry:
+        entry[0].record_exception(exception)
+        entry[0].set_status(Status(StatusCode.ERROR, str(exception)))
+
+
+def end_task_span(task_id: str, state: Optional[str]):
+    entry = _task_spans.pop(task_id, None)
+    if not entry:
+        return
+    span, token, task_name, started = entry
+    state = state or 'UNKNOWN'
+    span.set_attribute('celery.state', state)
+    span.end()
+    context.detach(token)
+    TASK_DURATION.labels(task_name, state).observe(time.perf_counter() - started)
+
+
+async def render_metrics() -> Tuple[bytes, str]:
+    """Prometheus exposition of this process, or of every process in multiprocess mode"""
+    from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest
+    from .services.redis_client import get_async_redis
+
+    try:
+        QUEUE_LENGTH.labels('celery').set(await get_async_redis().llen('celery'))
+    except Exception as e:
+        logger.warning(f"Could not read Celery queue length: {str(e)}")
+
+    registry = REGISTRY
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,80 @@
+"""Startup-time benchmark: per-module import cost of the API and worker entry points
+
+Run from the backend directory:
+
+    python benchmarks/startup_imports.py
+    python benchmarks/startup_imports.py --target app.tasks --top 30 --output report.json
+
+Each target is imported in a fresh interpreter with ``-X importtime`` so
+the numbers match a cold pod start. The report also lists which heavy
+libraries ended up loaded; for ``app.main`` that list should be empty.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ['moviepy', 'yt_dlp', 'boto3', 'botocore', 'stripe', 'numpy', 'celery']
+
+DEFAULT_TARGETS = ['app.main', 'app.tasks']
+
+
+def measure(target: str) -> dict:
+    """Import target in a fresh interpreter and collect -X importtime output"""
+    probe = (
+        f"import {target}, sys, json; "
+        f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    )
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', probe],
+        cwd=BACKEND_DIR, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {target} failed:\n{result.stderr[-2000:]}")
+
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        modules.append({
+            'module': name[1:].rstrip(),  # keeps the nesting indent
+            'self_ms': int(self_us) / 1000,
+            'cumulative_ms': int(cumulative_us) / 1000,
+        })
+
+    top_level = [m for m in modules if not m['module'].startswith(' ')]
+    return {
+        'target': target,
+        'total_ms': sum(m['cumulative_ms'] for m in top_level),
+        'heavy_modules_loaded': json.loads(result.stdout.strip().splitlines()[-1]),
+        'modules': sorted(modules, key=lambda m: m['cumulative_ms'], reverse=True),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--target', action='append', help='module to import (repeatable)')
+    parser.add_argument('--top', type=int, default=15, help='slowest modules to print')
+    parser.add_argument('--output', help='write the full report as JSON')
+    args = parser.parse_args()
+
+    reports = [measure(target) for target in args.target or DEFAULT_TARGETS]
+
+    for report in reports:
+        print(f"{report['target']}: {report['total_ms']:.1f} ms")
+        print(f"  heavy modules loaded: {', '.join(report['heavy_modules_loaded']) or 'none'}")
+        for module in report['modules'][:args.top]:
+            print(f"  {module['cumulative_ms']:9.1f} ms  {module['module'].strip()}")
+        print()
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(reports, output, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""Benchmark: cold vs pooled yt-dlp info lookups against a local stand-in extractor
+
+Run from the backend directory:
+
+    python benchmarks/ydl_pool.py
+    python benchmarks/ydl_pool.py --lookups 200 --connect-delay 0.03 --latency 0.01
+
+A local HTTP server plays the upstream site. The stand-in extractor
+fetches a "player script" once per extractor instance (like the YouTube
+player JS / signature functions) and one JSON document per video.
+--connect-delay is charged once per new TCP connection to mimic TLS
+setup, --latency on every request. The cold path builds a fresh
+YoutubeDL per lookup, as the service used to; the pooled path goes
+through app.services.ydl_pool.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from yt_dlp import YoutubeDL  # noqa: E402
+from yt_dlp.extractor.common import InfoExtractor  # noqa: E402
+
+from app.services.ydl_pool import YDLPool  # noqa: E402
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    connect_delay = 0.0
+    latency = 0.0
+
+    def setup(self):
+        time.sleep(self.connect_delay)
+        super().setup()
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        if self.path == '/player.js':
+            body = b'var sig=function(a){return a.split("").reverse().join("")};' * 2000
+            content_type = 'application/javascript'
+        else:
+            video_id = self.path.rsplit('/', 1)[-1]
+            body = json.dumps({'id': video_id, 'title': f'Video {video_id}', 'duration': 42}).encode()
+            content_type = 'application/json'
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def stand_in_extractor(base_url: str):
+    class StandInIE(InfoExtractor):
+        IE_NAME = 'standin'
+        _VALID_URL = r'standin://(?P<id>\w+)'
+
+        def _real_initialize(self):
+            # Stands in for the player JS / signature function download
+            self._player = self._download_webpage(f'{base_url}/player.js', None, note=False)
+
+        def _real_extract(self, url):
+            video_id = self._match_id(url)
+            data = self._download_json(f'{base_url}/videos/{video_id}', video_id, note=False)
+            return {
+                'id': data['id'],
+                'title': data['title'],
+                'duration': data['duration'],
+                'url': f'{base_url}/media/{video_id}.mp4',
+                'ext': 'mp4',
+            }
+
+    return StandInIE
+
+
+def timed(lookups: int, lookup) -> list:
+    timings = []
+    for index in range(lookups):
+        started = time.perf_counter()
+        lookup(f'standin://video{index}')
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def report(name: str, timings: list):
+    timings = sorted(timings)
+    p95 = timings[int(len(timings) * 0.95) - 1]
+    print(f"{name:>7}: mean {statistics.mean(timings):7.2f} ms  "
+          f"p50 {statistics.median(timings):7.2f} ms  p95 {p95:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lookups', type=int, default=100)
+    parser.add_argument('--connect-delay', type=float, default=0.02, help='seconds per new connection')
+    parser.add_argument('--latency', type=float, default=0.005, help='seconds per request')
+    args = parser.parse_args()
+
+    StandInHandler.connect_delay = args.connect_delay
+    StandInHandler.latency = args.latency
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_address[1]}'
+    extractor = stand_in_extractor(base_url)
+
+    options = {'quiet': True, 'no_warnings': True, 'cachedir': False}
+
+    def cold(url):
+        with YoutubeDL(options) as ydl:
+            ydl.add_info_extractor(extractor())
+            ydl.extract_info(url, download=False, ie_key='StandIn')
+
+    pool = YDLPool(size=1, setup=lambda ydl: ydl.add_info_extractor(extractor()))
+
+    def pooled(url):
+        with pool.acquire(options) as ydl:
+            ydl.extract_info(url, download=False, ie_key='StandIn')
+
+    report('cold', timed(args.lookups, cold))
+    report('pooled', timed(args.lookups, pooled))
+
+    pool.close()
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
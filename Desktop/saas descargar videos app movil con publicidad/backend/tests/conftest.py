@@ -0,0 +1,47 @@
+import hashlib
+import hmac
+import json
+import os
+import time
+
+# Settings are read once, before the app is imported
+os.environ.setdefault('STRIPE_WEBHOOK_SECRET', 'whsec_test')
+os.environ.setdefault('TRACE_EXPORTER', 'none')
+
+import fakeredis  # noqa: E402
+import fakeredis.aioredis  # noqa: E402
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.main import app  # noqa: E402
+from app.services import redis_client  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'fixtures', 'stripe')
+
+
+def load_fixture(name: str) -> dict:
+    with open(os.path.join(FIXTURES, name)) as fixture:
+        return json.load(fixture)
+
+
+def sign(payload: bytes, secret: str = None) -> str:
+    """Stripe-Signature header for payload, computed the way Stripe does"""
+    secret = secret or os.environ['STRIPE_WEBHOOK_SECRET']
+    timestamp = int(time.time())
+    signature = hmac.new(secret.encode(), f"{timestamp}.".encode() + payload, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={signature}"
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    """In-memory Redis (with Lua) behind both shared clients; yields the blocking one"""
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis_client, '_sync_client', fakeredis.FakeRedis(server=server))
+    monkeypatch.setattr(redis_client, '_async_client', fakeredis.aioredis.FakeRedis(server=server))
+    return redis_client._sync_client
+
+
+@pytest.fixture
+def client(redis):
+    with TestClient(app) as test_client:
+        yield test_client
@@ -0,0 +1,110 @@
+import numpy as np
+import pytest
+from PIL import ImageFont
+from app.services.frame_pipeline import Overlay, _load_font, build_overlays, vertical_crop
+
+needs_truetype = pytest.mark.skipif(
+    not isinstance(_load_font(10), ImageFont.FreeTypeFont),
+    reason="no TrueType font installed, text doesn't scale"
+)
+
+LANDSCAPE_CROP = (656, 0, 607, 1080)  # vertical_crop(1920, 1080, '1080x1920')
+LANDSCAPE_SCALE = 1920 / 1080
+
+
+def test_vertical_crop_of_landscape_source_is_centred_full_height():
+    assert vertical_crop(1920, 1080, '1080x1920') == LANDSCAPE_CROP
+
+
+def test_vertical_crop_of_tall_source_is_centred_full_width():
+    assert vertical_crop(1080, 2400, '1080x1920') == (0, 240, 1080, 1920)
+
+
+def test_vertical_crop_of_matching_source_keeps_everything():
+    assert vertical_crop(720, 1280, '1080x1920') == (0, 0, 720, 1280)
+
+
+def _build(overlays, scale=LANDSCAPE_SCALE):
+    return build_overlays(overlays, (1920, 1080), LANDSCAPE_CROP, scale, (1080, 1920), 10)
+
+
+def test_overlay_centred_on_source_is_centred_in_crop():
+    [overlay] = _build([{'text': 'Hi', 'position': ('center', 'top')}])
+    rows, cols = overlay.box
+
+    assert rows.start == 0
+    assert abs(cols.start - (1080 - cols.stop)) <= 1
+
+
+def test_overlay_at_bottom_ends_at_frame_bottom():
+    [overlay] = _build([{'text': 'Hi', 'position': ('center', 'bottom')}])
+
+    assert overlay.box[0].stop == 1920
+
+
+def test_overlay_outside_the_crop_is_dropped():
+    # Top-left of a landscape source, cropped away by the centre crop
+    assert _build([{'text': 'Hi', 'position': (10, 10)}]) == []
+
+
+def test_overlay_partly_outside_the_crop_is_clipped_to_the_frame():
+    [overlay] = _build([{'text': 'A fairly long caption', 'position': (600, 500)}])
+    rows, cols = overlay.box
+
+    assert cols.start == 0
+    assert overlay.premultiplied.shape[:2] == (rows.stop - rows.start, cols.stop - cols.start)
+
+
+@needs_truetype
+def test_overlay_is_rasterised_at_output_scale():
+    [small] = _build([{'text': 'Hi', 'fontsize': 40, 'position': ('center', 'center')}], scale=1)
+    [large] = _build([{'text': 'Hi', 'fontsize': 40, 'position': ('center', 'center')}], scale=2)
+
+    small_h = small.box[0].stop - small.box[0].start
+    large_h = large.box[0].stop - large.box[0].start
+    assert large_h == pytest.approx(2 * small_h, abs=3)
+
+
+def test_overlay_timing_defaults_to_the_rest_of_the_edit():
+    timed, untimed = _build([
+        {'text': 'a', 'position': ('center', 'center'), 'start': 2, 'duration': 3},
+        {'text': 'b', 'position': ('center', 'center'), 'start': 4},
+    ])
+
+    assert [timed.active(t) for t in (1.9, 2, 4.9, 5)] == [False, True, True, False]
+    assert (untimed.start, untimed.end) == (4, 10)
+
+
+def _overlay(rgba, x=0, y=0, frame_size=(4, 4)):
+    return Overlay(np.asarray(rgba, dtype=np.uint8), x, y, frame_size[0], frame_size[1], 0, 1)
+
+
+def test_blend_mixes_by_alpha_inside_the_box_only():
+    rgba = [[[200, 0, 0, 255], [200, 0, 0, 0], [200, 0, 0, 128]]]
+    frame = np.full((4, 4, 3), 100, dtype=np.uint8)
+
+    _overlay(rgba, x=1, y=2).blend(frame)
+
+    assert frame[2, 1].tolist() == [200, 0, 0]
+    assert frame[2, 2].tolist() == [100, 100, 100]
+    assert frame[2, 3].tolist() == [150, 49, 49]
+    untouched = np.ones((4, 4), dtype=bool)
+    untouched[2, 1:4] = False
+    assert (frame[untouched] == 100).all()
+
+
+def test_blend_clips_the_bitmap_at_the_frame_edge():
+    rgba = np.zeros((2, 2, 4), dtype=np.uint8)
+    rgba[..., 0] = 255
+    rgba[..., 3] = 255
+    frame = np.zeros((4, 4, 3), dtype=np.uint8)
+
+    overlay = _overlay(rgba, x=-1, y=3)
+    overlay.blend(frame)
+
+    assert frame[..., 0].sum() == 255
+    assert frame[3, 0, 0] == 255
+
+
+def test_bitmap_fully_off_frame_is_not_visible():
+    assert not _overlay(np.zeros((2, 2, 4)), x=5, y=0).visible
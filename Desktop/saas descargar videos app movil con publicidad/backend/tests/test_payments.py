@@ -0,0 +1,166 @@
+import copy
+import json
+import time
+import pytest
+from app.routers import payment
+from app.services import entitlements as entitlements_module
+from app.services.entitlements import EVENT_STREAM, apply_event, entitlement_store, entitlements_key
+from conftest import load_fixture, sign
+
+MONTH = 30 * 24 * 3600
+
+
+def _post_event(client, event: dict, signature: str = None):
+    payload = json.dumps(event).encode()
+    return client.post(
+        '/api/payment/webhook',
+        content=payload,
+        headers={'Content-Type': 'application/json', 'Stripe-Signature': signature or sign(payload)}
+    )
+
+
+def _purchase(product_type: str, amount: int, event_id: str = 'evt_test', user_id: str = 'user-1') -> dict:
+    event = copy.deepcopy(load_fixture('payment_intent_succeeded.json'))
+    event['id'] = event_id
+    event['data']['object'].update(amount=amount, metadata={'product_type': product_type, 'user_id': user_id})
+    return event
+
+
+def _entitlements(redis, user_id: str = 'user-1') -> dict:
+    return {key.decode(): float(value) for key, value in redis.hgetall(entitlements_key(user_id)).items()}
+
+
+@pytest.fixture(autouse=True)
+def fresh_entitlement_cache():
+    entitlement_store._cache.clear()
+
+
+def test_signed_fixture_is_queued(client, redis):
+    event = load_fixture('payment_intent_succeeded.json')
+
+    response = _post_event(client, event)
+
+    assert response.status_code == 200
+    entries = redis.xrange(EVENT_STREAM)
+    assert len(entries) == 1
+    assert entries[0][1][b'id'] == event['id'].encode()
+
+
+def test_bad_signature_is_rejected(client, redis):
+    response = _post_event(client, load_fixture('payment_intent_succeeded.json'), signature='t=1,v1=bad')
+
+    assert response.status_code == 400
+    assert redis.xlen(EVENT_STREAM) == 0
+
+
+def test_repeated_event_id_is_queued_once(client, redis):
+    event = load_fixture('payment_intent_succeeded.json')
+
+    responses = [_post_event(client, event) for _ in range(3)]
+
+    assert [response.status_code for response in responses] == [200, 200, 200]
+    assert redis.xlen(EVENT_STREAM) == 1
+
+
+def test_extend_grant_is_applied_once_per_event(redis):
+    event = load_fixture('payment_intent_succeeded.json')
+    user_id = event['data']['object']['metadata']['user_id']
+
+    assert apply_event(redis, event['id'], event) is True
+    premium_until = _entitlements(redis, user_id)['premium_until']
+    assert apply_event(redis, event['id'], event) is False
+
+    assert _entitlements(redis, user_id)['premium_until'] == premium_until
+    assert premium_until == pytest.approx(time.time() + MONTH, abs=5)
+
+
+def test_extend_grants_of_different_events_add_up(redis):
+    apply_event(redis, 'evt_1', _purchase('premium_monthly', 999, 'evt_1'))
+    apply_event(redis, 'evt_2', _purchase('premium_monthly', 999, 'evt_2'))
+
+    assert _entitlements(redis)['premium_until'] == pytest.approx(time.time() + 2 * MONTH, abs=5)
+
+
+def test_credit_grant_is_applied_once_per_event(redis):
+    event = _purchase('hd_export', 299)
+
+    assert apply_event(redis, event['id'], event) is True
+    assert apply_event(redis, event['id'], event) is False
+    apply_event(redis, 'evt_other', _purchase('hd_export', 299, 'evt_other'))
+
+    assert _entitlements(redis)['hd_exports'] == 2
+
+
+@pytest.mark.parametrize('amount, currency', [(1, 'usd'), (999, 'eur')])
+def test_payment_not_matching_the_price_grants_nothing(redis, amount, currency):
+    event = _purchase('premium_monthly', amount)
+    event['data']['object']['currency'] = currency
+
+    assert apply_event(redis, event['id'], event) is False
+    assert _entitlements(redis) == {}
+
+
+def test_failed_payment_grants_nothing(redis):
+    event = load_fixture('payment_intent_payment_failed.json')
+
+    assert apply_event(redis, event['id'], event) is False
+
+
+def test_payment_intent_is_priced_on_the_server(client, monkeypatch):
+    created = {}
+
+    class PaymentIntent:
+        @staticmethod
+        def create(**kwargs):
+            created.update(kwargs)
+            return type('Intent', (), {'client_secret': 'secret', 'id': 'pi_test'})
+
+    monkeypatch.setattr(payment.get_stripe(), 'PaymentIntent', PaymentIntent)
+
+    response = client.post('/api/payment/create-payment-intent', json={
+        'product_type': 'hd_export', 'user_id': 'user-1', 'amount': 1, 'currency': 'usd'
+    })
+
+    assert response.status_code == 200
+    assert (created['amount'], created['currency']) == (299, 'usd')
+
+
+def test_unknown_product_is_rejected(client):
+    response = client.post('/api/payment/create-payment-intent', json={'product_type': 'free_stuff'})
+
+    assert response.status_code == 400
+
+
+def test_products_come_from_the_price_table(client):
+    products = {product['id']: product for product in client.get('/api/payment/products').json()['products']}
+
+    assert {name: product['price'] for name, product in products.items()} == {
+        'premium_monthly': 999, 'hd_export': 299, 'remove_ads': 199
+    }
+
+
+def test_entitlements_are_not_exposed_without_auth(client):
+    assert client.get('/api/payment/entitlements/user-1').status_code == 404
+
+
+def test_entitlement_cache_is_bounded(client, redis, monkeypatch):
+    monkeypatch.setattr(entitlements_module.settings, 'entitlement_cache_size', 3)
+
+    async def look_up(user_ids):
+        for user_id in user_ids:
+            await entitlement_store.get(user_id)
+
+    client.portal.call(look_up, [f'user-{index}' for index in range(10)])
+
+    assert list(entitlement_store._cache) == ['user-7', 'user-8', 'user-9']
+
+
+def test_expired_entitlement_cache_entries_are_evicted(client, redis):
+    entitlement_store._cache['stale-user'] = (0, {})
+
+    async def look_up(user_id):
+        await entitlement_store.get(user_id)
+
+    client.portal.call(look_up, 'user-1')
+
+    assert list(entitlement_store._cache) == ['user-1']
@@ -0,0 +1,199 @@
+import asyncio
+import importlib
+import time
+from types import SimpleNamespace
+import pytest
+from app.services.rate_limiter import RateLimiter, RateLimitExceeded, client_id
+
+# app.services resolves these names to the service instances, not the modules
+limiter_module = importlib.import_module('app.services.rate_limiter')
+download_module = importlib.import_module('app.routers.download')
+
+
+@pytest.fixture
+def limits(monkeypatch, redis):
+    settings = limiter_module.settings
+    monkeypatch.setattr(settings, 'rate_limit_enabled', True)
+    monkeypatch.setattr(settings, 'trusted_proxy_count', 0)
+    return settings
+
+
+def _request(forwarded_for=None, peer='10.0.0.5'):
+    headers = {'x-forwarded-for': forwarded_for} if forwarded_for else {}
+    return SimpleNamespace(headers=headers, client=SimpleNamespace(host=peer))
+
+
+def test_empty_bucket_answers_429_with_retry_after(client, limits, monkeypatch):
+    monkeypatch.setattr(limits, 'info_requests_per_minute', 2)
+
+    async def get_video_info(url):
+        return {'video_id': url}
+
+    monkeypatch.setattr(download_module, 'youtube_service', SimpleNamespace(get_video_info=get_video_info))
+
+    responses = [client.get('/api/download/info', params={'url': f'https://youtu.be/v{index}'}) for index in range(3)]
+
+    assert [response.status_code for response in responses] == [200, 200, 429]
+    # Two per minute: the next token is about 30s away
+    assert 29 <= int(responses[2].headers['Retry-After']) <= 30
+
+
+def test_buckets_are_per_client(limits):
+    limiter = RateLimiter()
+
+    async def main():
+        await limiter.check_client('client-a', 'info', 1)
+        await limiter.check_client('client-b', 'info', 1)
+        with pytest.raises(RateLimitExceeded) as rejected:
+            await limiter.check_client('client-a', 'info', 1)
+        return rejected.value.retry_after
+
+    assert 59 <= asyncio.run(main()) <= 60
+
+
+def test_upstream_waits_for_a_token_instead_of_rejecting(limits, redis, monkeypatch):
+    monkeypatch.setattr(limits, 'upstream_requests_per_minute', 600)  # one token per 100 ms
+    seconds, micros = redis.time()
+    redis.hset('ratelimit:upstream:youtube.com', mapping={'tokens': 0, 'ts': seconds * 1000 + micros // 1000})
+    limiter = RateLimiter()
+
+    async def main():
+        started = time.perf_counter()
+        async with limiter.upstream('https://www.youtube.com/watch?v=a'):
+            return time.perf_counter() - started
+
+    assert 0.05 <= asyncio.run(main()) < 1
+
+
+def test_upstream_queues_for_a_free_slot(limits, monkeypatch):
+    monkeypatch.setattr(limits, 'upstream_max_concurrency', 1)
+    monkeypatch.setattr(limits, 'upstream_queue_timeout', 5)
+    limiter = RateLimiter()
+    url = 'https://www.youtube.com/watch?v=a'
+
+    async def hold(seconds):
+        async with limiter.upstream(url):
+            await asyncio.sleep(seconds)
+
+    async def main():
+        holder = asyncio.create_task(hold(0.3))
+        await asyncio.sleep(0.05)
+        started = time.perf_counter()
+        async with limiter.upstream(url):
+            waited = time.perf_counter() - started
+        await holder
+        return waited
+
+    assert 0.2 <= asyncio.run(main()) < 5
+
+
+def test_upstream_gives_up_after_queue_timeout(limits, monkeypatch):
+    monkeypatch.setattr(limits, 'upstream_max_concurrency', 1)
+    monkeypatch.setattr(limits, 'upstream_queue_timeout', 0.3)
+    limiter = RateLimiter()
+    url = 'https://www.youtube.com/watch?v=a'
+
+    async def main():
+        release = asyncio.Event()
+
+        async def hold():
+            async with limiter.upstream(url):
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0.05)
+        started = time.perf_counter()
+        try:
+            with pytest.raises(RateLimitExceeded) as rejected:
+                async with limiter.upstream(url):
+                    pass
+            return time.perf_counter() - started, rejected.value.retry_after
+        finally:
+            release.set()
+            await holder
+
+    waited, retry_after = asyncio.run(main())
+    # Stops once the next backoff would overrun the timeout, never after it
+    assert 0.1 <= waited <= 0.3
+    assert retry_after == 5
+
+
+def test_expired_slot_lease_frees_the_slot(limits, redis, monkeypatch):
+    monkeypatch.setattr(limits, 'upstream_max_concurrency', 1)
+    monkeypatch.setattr(limits, 'upstream_queue_timeout', 0.5)
+    # A pod that crashed while holding the only slot, lease already over
+    redis.zadd('ratelimit:upstream-slots:youtube.com', {'crashed-pod': 1})
+    limiter = RateLimiter()
+
+    async def main():
+        async with limiter.upstream('https://youtu.be/a'):
+            return True
+
+    assert asyncio.run(main())
+
+
+def test_concurrent_identical_requests_run_once(limits):
+    pods = [RateLimiter(), RateLimiter()]
+    calls = []
+
+    async def producer():
+        calls.append(1)
+        await asyncio.sleep(0.3)
+        return {'video_id': 'abc'}
+
+    async def main():
+        return await asyncio.gather(*[pods[index % 2].coalesce('info:abc', producer) for index in range(6)])
+
+    results = asyncio.run(main())
+
+    assert results == [{'video_id': 'abc'}] * 6
+    assert len(calls) == 1
+
+
+def test_waiter_takes_over_when_the_leader_fails(limits):
+    leader_pod, other_pod = RateLimiter(), RateLimiter()
+    calls = []
+
+    async def failing():
+        calls.append('leader')
+        await asyncio.sleep(0.2)
+        raise RuntimeError('upstream hiccup')
+
+    async def working():
+        calls.append('waiter')
+        return {'video_id': 'abc'}
+
+    async def main():
+        leader = asyncio.create_task(leader_pod.coalesce('info:abc', failing))
+        local_waiter = asyncio.create_task(leader_pod.coalesce('info:abc', working))
+        await asyncio.sleep(0.05)
+        remote_waiter = asyncio.create_task(other_pod.coalesce('info:abc', working))
+        return await asyncio.gather(leader, local_waiter, remote_waiter, return_exceptions=True)
+
+    leader, local_waiter, remote_waiter = asyncio.run(main())
+
+    # Same-pod waiters share the leader's outcome; the other pod runs its own
+    assert isinstance(leader, RuntimeError)
+    assert isinstance(local_waiter, RuntimeError)
+    assert remote_waiter == {'video_id': 'abc'}
+    assert calls == ['leader', 'waiter']
+
+
+def test_client_id_ignores_forwarded_for_without_trusted_proxies(limits):
+    assert client_id(_request('1.2.3.4')) == '10.0.0.5'
+
+
+def test_client_id_takes_the_hop_added_by_our_proxy(limits, monkeypatch):
+    monkeypatch.setattr(limits, 'trusted_proxy_count', 1)
+
+    assert client_id(_request('1.2.3.4')) == '1.2.3.4'
+    # The client prepended a fake hop; our proxy appended the real address
+    assert client_id(_request('6.6.6.6, 1.2.3.4')) == '1.2.3.4'
+
+
+def test_client_id_counts_several_proxies_from_the_right(limits, monkeypatch):
+    monkeypatch.setattr(limits, 'trusted_proxy_count', 2)
+
+    assert client_id(_request('6.6.6.6, 1.2.3.4, 172.16.0.1')) == '1.2.3.4'
+    # Fewer hops than proxies: the header is not what our proxies send
+    assert client_id(_request('1.2.3.4')) == '10.0.0.5'
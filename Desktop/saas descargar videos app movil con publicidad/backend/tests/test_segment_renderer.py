@@ -0,0 +1,127 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from app.services import segment_renderer as renderer_module
+from app.services.segment_renderer import SegmentRenderer, plan_segments, shift_overlays
+
+
+def test_plan_segments_cuts_at_keyframes_past_target_length():
+    keyframes = [0, 4, 10, 12, 21, 30, 40]
+
+    assert plan_segments(0, 50, keyframes, 10) == [(0, 10), (10, 21), (21, 40), (40, 50)]
+
+
+def test_plan_segments_folds_short_tail_into_previous_segment():
+    # 40 -> 43 is shorter than half a segment, so it joins the 30 -> 40 segment
+    assert plan_segments(0, 43, [10, 20, 30, 40], 10) == [(0, 10), (10, 20), (20, 30), (30, 43)]
+
+
+def test_plan_segments_keeps_tail_of_half_target_length():
+    assert plan_segments(0, 45, [10, 20, 30, 40], 10) == [(0, 10), (10, 20), (20, 30), (30, 40), (40, 45)]
+
+
+def test_plan_segments_without_keyframes_is_one_segment():
+    assert plan_segments(5, 95, [], 10) == [(5, 95)]
+
+
+def test_plan_segments_ignores_keyframes_outside_the_edit():
+    assert plan_segments(15, 35, [0, 10, 15, 25, 35, 50], 10) == [(15, 25), (25, 35)]
+
+
+def test_shift_overlays_clips_overlay_crossing_segment_start():
+    overlays = [{'text': 'hi', 'start': 8, 'duration': 5}]
+
+    assert shift_overlays(overlays, 10, 10) == [{'text': 'hi', 'start': 0, 'duration': 3}]
+
+
+def test_shift_overlays_clips_overlay_crossing_segment_end():
+    overlays = [{'text': 'hi', 'start': 18, 'duration': 5}]
+
+    assert shift_overlays(overlays, 10, 10) == [{'text': 'hi', 'start': 8, 'duration': 2}]
+
+
+def test_shift_overlays_splits_overlay_spanning_several_segments():
+    overlays = [{'text': 'hi', 'start': 5, 'duration': 20}]
+    segments = [(0, 10), (10, 20), (20, 30)]
+
+    shifted = [shift_overlays(overlays, start, end - start) for start, end in segments]
+
+    assert shifted == [
+        [{'text': 'hi', 'start': 5, 'duration': 5}],
+        [{'text': 'hi', 'start': 0, 'duration': 10}],
+        [{'text': 'hi', 'start': 0, 'duration': 5}],
+    ]
+
+
+def test_shift_overlays_without_duration_lasts_to_segment_end():
+    assert shift_overlays([{'text': 'hi', 'start': 12}], 10, 10) == [{'text': 'hi', 'start': 2, 'duration': 8}]
+
+
+def test_shift_overlays_drops_overlays_outside_the_segment():
+    overlays = [{'text': 'before', 'start': 0, 'duration': 10}, {'text': 'after', 'start': 20}]
+
+    assert shift_overlays(overlays, 10, 10) == []
+
+
+def test_shift_overlays_defaults_start_to_zero():
+    assert shift_overlays([{'text': 'hi', 'duration': 15}], 10, 10) == [{'text': 'hi', 'start': 0, 'duration': 5}]
+
+
+@pytest.mark.parametrize('parallel_render', ['off', 'process'])
+def test_plan_caps_edit_without_end_time_at_max_video_duration(monkeypatch, parallel_render):
+    monkeypatch.setattr(renderer_module, 'probe_duration', lambda path: 1000.0)
+    monkeypatch.setattr(renderer_module, 'probe_keyframes', lambda path: [])
+    monkeypatch.setattr(renderer_module.settings, 'parallel_render', parallel_render)
+    monkeypatch.setattr(renderer_module.settings, 'max_video_duration', 300)
+
+    assert SegmentRenderer().plan('source.mp4', 10, None) == [(10, 310)]
+
+
+@pytest.mark.parametrize('parallel_render', ['off', 'process'])
+def test_plan_ends_short_source_at_its_duration(monkeypatch, parallel_render):
+    monkeypatch.setattr(renderer_module, 'probe_duration', lambda path: 20.0)
+    monkeypatch.setattr(renderer_module, 'probe_keyframes', lambda path: [])
+    monkeypatch.setattr(renderer_module.settings, 'parallel_render', parallel_render)
+
+    assert SegmentRenderer().plan('source.mp4', 0, 45) == [(0, 20.0)]
+
+
+@pytest.fixture
+def process_renderer(monkeypatch, tmp_path):
+    monkeypatch.setattr(renderer_module.settings, 'parallel_render', 'process')
+    monkeypatch.setattr(renderer_module, 'has_audio_stream', lambda path: False)
+    renderer = SegmentRenderer()
+    renderer.temp_path = str(tmp_path)
+    return renderer
+
+
+def test_broken_pool_is_replaced(process_renderer):
+    pool = process_renderer.pool
+    pool.submit(os._exit, 1)
+    with pytest.raises(Exception):
+        pool.submit(time.sleep, 0).result(timeout=30)
+
+    with pytest.raises(Exception, match='Error rendering segments'):
+        asyncio.run(process_renderer.render('source.mp4', [(0, 10), (10, 20)]))
+
+    assert process_renderer._pool is None
+    assert process_renderer.pool is not pool
+    process_renderer._reset_pool()
+
+
+def test_failed_render_removes_written_segments(process_renderer, monkeypatch, tmp_path):
+    def render_segment(job):
+        if job['start'] == 10:
+            raise RuntimeError('decoder crashed')
+        open(job['output_path'], 'wb').close()
+        return job['output_path']
+
+    monkeypatch.setattr(renderer_module, 'render_segment', render_segment)
+    process_renderer._pool = ThreadPoolExecutor(max_workers=3)
+
+    with pytest.raises(Exception, match='decoder crashed'):
+        asyncio.run(process_renderer.render('source.mp4', [(0, 10), (10, 20), (20, 30)]))
+
+    assert os.listdir(tmp_path) == []
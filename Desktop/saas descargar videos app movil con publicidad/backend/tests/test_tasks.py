@@ -0,0 +1,36 @@
+from types import SimpleNamespace
+from app import tasks
+
+
+async def _download_video(url, start_time=None, end_time=None, profile=None):
+    return {'video_id': url, 'section': (start_time, end_time), 'profile': profile}
+
+
+async def _process_video(filepath, profile=None, **edits):
+    return f"{filepath}:{profile}:{edits['start_time']}-{edits['end_time']}"
+
+
+async def _upload_file(filepath):
+    return f"https://cdn.example/{filepath}"
+
+
+def test_download_task_returns_the_result_not_a_coroutine(monkeypatch):
+    monkeypatch.setattr(tasks, 'youtube_service', SimpleNamespace(download_video=_download_video))
+
+    result = tasks.download_video_task('abc', start_time=5, end_time=15, profile='hd')
+
+    assert result == {'video_id': 'abc', 'section': (5, 15), 'profile': 'hd'}
+
+
+def test_process_task_returns_the_result_not_a_coroutine(monkeypatch):
+    monkeypatch.setattr(tasks, 'video_service', SimpleNamespace(process_video=_process_video))
+
+    result = tasks.process_video_task('clip.mp4', start_time=5, end_time=15, profile='preview')
+
+    assert result == 'clip.mp4:preview:5-15'
+
+
+def test_upload_task_returns_the_url_not_a_coroutine(monkeypatch):
+    monkeypatch.setattr(tasks, 'storage_service', SimpleNamespace(upload_file=_upload_file))
+
+    assert tasks.upload_to_storage_task('clip.mp4') == 'https://cdn.example/clip.mp4'
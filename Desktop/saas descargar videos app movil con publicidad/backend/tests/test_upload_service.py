@@ -0,0 +1,112 @@
+import asyncio
+import fcntl
+import hashlib
+import os
+import pytest
+from app.services.upload_service import UploadConflict, UploadService
+
+DATA = os.urandom(200 * 1024)
+DATA_SHA256 = hashlib.sha256(DATA).hexdigest()
+
+
+async def _chunks(data: bytes):
+    yield data
+
+
+@pytest.fixture
+def uploads(tmp_path):
+    service = UploadService()
+    service.root = str(tmp_path)
+    service.blob_dir = str(tmp_path / 'blobs')
+    return service
+
+
+def _store(uploads: UploadService):
+    upload = uploads.create(len(DATA), 'clip.mp4', DATA_SHA256)
+    asyncio.run(uploads.append(upload['upload_id'], 0, _chunks(DATA)))
+    return asyncio.run(uploads.finalize(upload['upload_id']))
+
+
+def _answer(status):
+    offset, length = status['challenge_offset'], status['challenge_length']
+    return hashlib.sha256(DATA[offset:offset + length]).hexdigest()
+
+
+def test_new_file_is_uploaded_without_challenge(uploads):
+    upload = uploads.create(len(DATA), 'clip.mp4', DATA_SHA256)
+
+    assert upload['complete'] is False
+    assert upload['challenge_offset'] is None
+    assert _store(uploads)['sha256'] == DATA_SHA256
+
+
+def test_known_hash_is_challenged_not_completed(uploads):
+    _store(uploads)
+
+    upload = uploads.create(len(DATA), 'copy.mp4', DATA_SHA256)
+
+    assert upload['complete'] is False
+    assert upload['challenge_length'] == 64 * 1024
+    assert 0 <= upload['challenge_offset'] <= len(DATA) - upload['challenge_length']
+    with pytest.raises(UploadConflict):
+        uploads.get_path(upload['upload_id'])
+
+
+def test_correct_answer_completes_from_stored_copy(uploads):
+    _store(uploads)
+    upload = uploads.create(len(DATA), 'copy.mp4', DATA_SHA256)
+
+    status = uploads.verify(upload['upload_id'], _answer(upload))
+
+    assert status['complete'] is True
+    assert status['deduplicated'] is True
+    assert status['challenge_offset'] is None
+    with open(uploads.get_path(upload['upload_id']), 'rb') as stored:
+        assert stored.read() == DATA
+
+
+def test_wrong_answer_uses_up_the_challenge(uploads):
+    _store(uploads)
+    upload = uploads.create(len(DATA), 'copy.mp4', DATA_SHA256)
+
+    with pytest.raises(ValueError):
+        uploads.verify(upload['upload_id'], hashlib.sha256(b'guess').hexdigest())
+    with pytest.raises(UploadConflict):
+        uploads.verify(upload['upload_id'], _answer(upload))
+
+    # The file can still be sent the normal way
+    asyncio.run(uploads.append(upload['upload_id'], 0, _chunks(DATA)))
+    assert asyncio.run(uploads.finalize(upload['upload_id']))['deduplicated'] is True
+
+
+def test_concurrent_finalize_completes_once(uploads):
+    upload = uploads.create(len(DATA), 'clip.mp4', DATA_SHA256)
+    asyncio.run(uploads.append(upload['upload_id'], 0, _chunks(DATA)))
+
+    async def main():
+        return await asyncio.gather(
+            *[uploads.finalize(upload['upload_id']) for _ in range(3)],
+            return_exceptions=True
+        )
+
+    results = asyncio.run(main())
+
+    completed = [result for result in results if isinstance(result, dict)]
+    assert completed and all(result['complete'] and result['sha256'] == DATA_SHA256 for result in completed)
+    # The others are told it's busy, never a missing file
+    assert all(isinstance(result, UploadConflict) for result in results if not isinstance(result, dict))
+    assert asyncio.run(uploads.finalize(upload['upload_id']))['complete'] is True
+    with open(uploads.get_path(upload['upload_id']), 'rb') as stored:
+        assert stored.read() == DATA
+
+
+def test_finalize_while_a_chunk_is_written_is_a_conflict(uploads):
+    upload = uploads.create(len(DATA), 'clip.mp4', None)
+    asyncio.run(uploads.append(upload['upload_id'], 0, _chunks(DATA)))
+
+    with open(uploads._part_path(upload['upload_id']), 'ab') as part:
+        fcntl.flock(part, fcntl.LOCK_EX)
+        with pytest.raises(UploadConflict):
+            asyncio.run(uploads.finalize(upload['upload_id']))
+
+    assert asyncio.run(uploads.finalize(upload['upload_id']))['sha256'] == DATA_SHA256
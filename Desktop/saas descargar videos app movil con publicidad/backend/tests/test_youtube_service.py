@@ -0,0 +1,78 @@
+import asyncio
+import importlib
+import time
+import pytest
+from app.services.youtube_service import YouTubeService
+
+# app.services resolves the name to the service instance, not the module
+youtube_module = importlib.import_module('app.services.youtube_service')
+
+
+def test_lookups_run_off_the_event_loop(monkeypatch):
+    service = YouTubeService()
+
+    def slow_info(url):
+        time.sleep(0.3)
+        return {'video_id': url}
+
+    monkeypatch.setattr(service, '_info', slow_info)
+
+    async def main():
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        started = time.perf_counter()
+        results = await asyncio.gather(*[service.get_video_info(f'video{index}') for index in range(3)])
+        elapsed = time.perf_counter() - started
+        ticker.cancel()
+        return results, elapsed, ticks
+
+    results, elapsed, ticks = asyncio.run(main())
+
+    assert [result['video_id'] for result in results] == ['video0', 'video1', 'video2']
+    # The three lookups overlap and the loop keeps running meanwhile
+    assert elapsed < 0.6
+    assert ticks >= 10
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    monkeypatch.setattr(youtube_module.settings, 'max_video_duration', 60)
+    monkeypatch.setattr(youtube_module.settings, 'long_video_policy', 'clip')
+    return youtube_module.settings
+
+
+def test_short_source_is_fetched_whole(limits):
+    assert YouTubeService()._resolve_section(90, None, None) is None
+
+
+@pytest.mark.parametrize('duration', [500, 0, None])
+def test_long_or_unknown_source_is_clipped(limits, duration):
+    assert YouTubeService()._resolve_section(duration, None, None) == (0, 120)
+
+
+@pytest.mark.parametrize('duration, message', [(500, 'too long'), (None, 'unknown')])
+def test_long_or_unknown_source_is_rejected_by_policy(limits, monkeypatch, duration, message):
+    monkeypatch.setattr(limits, 'long_video_policy', 'reject')
+
+    with pytest.raises(Exception, match=message):
+        YouTubeService()._resolve_section(duration, None, None)
+
+
+def test_requested_range_is_capped(limits):
+    service = YouTubeService()
+
+    assert service._resolve_section(500, 10, None) == (10, 70)
+    assert service._resolve_section(500, 10, 400) == (10, 70)
+    assert service._resolve_section(30, 10, 50) == (10, 30)
+
+
+def test_range_past_the_end_is_rejected(limits):
+    with pytest.raises(Exception, match='past the end'):
+        YouTubeService()._resolve_section(30, 40, None)